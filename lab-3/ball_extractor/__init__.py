@@ -9,3 +9,13 @@ __author__ = 'Mike Nystoriak'
 __credits__ = ['Mike Nystoriak']
 
 from .extractor import BallExtractor
+from .detections import Detections
+from .stats import StageStats
+from .source import (
+    FrameSource,
+    FrameBuffer,
+    ImageSource,
+    CaptureSource,
+    ReplaySource,
+    open_source
+)
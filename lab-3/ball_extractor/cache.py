@@ -0,0 +1,127 @@
+"""Remembers detections between runs of a ball extractor."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import json
+import hashlib
+import numpy as np
+
+class DetectionCache:
+    """Describes a persistent record of the circles found in each image.
+
+    An image is only considered unchanged if its size and modification time,
+    or optionally a checksum of its contents, still match what was recorded.
+    The whole record is discarded whenever the parameters it was produced
+    with change.
+    """
+
+    FILENAME = '.detections.json'
+
+    def __init__(self, dst, parameters, checksum=False):
+        """Initializes a detection cache, loading any earlier record.
+
+        Args:
+            dst        str:  The output directory that houses the record.
+            parameters str:  Describes every setting that affects detection or
+                             output. A mismatch invalidates the record.
+            checksum   bool: Whether images are compared by the SHA-1 of their
+                             contents instead of their size and modification
+                             time. Default is `False`.
+        """
+
+        self.__path = os.path.join(dst, self.FILENAME)
+        self.__parameters = parameters
+        self.__checksum = checksum
+        self.__entries = {}
+        self.__fingerprints = {}
+
+        try:
+            with open(self.__path) as f:
+                record = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+
+        if record.get('parameters') == parameters:
+            self.__entries = record.get('entries', {})
+
+    def lookup(self, path):
+        """Fetches the circles recorded for an image if it is unchanged.
+
+        Args:
+            path str: The path to an image.
+
+        Returns:
+            numpy.ndarray: An Nx3 array of (x, y, r) rows, or `None` if the
+                           image has to be processed again, as it does when
+                           it can't be read.
+        """
+
+        fingerprint = self.__fingerprint(path)
+        self.__fingerprints[path] = fingerprint
+
+        entry = self.__entries.get(path)
+        if fingerprint is None or entry is None:
+            return None
+        if entry['fingerprint'] != fingerprint:
+            return None
+        return np.array(entry['circles'], dtype=np.float32).reshape(-1, 3)
+
+    def store(self, path, circles):
+        """Records the circles found in an image.
+
+        Nothing is recorded for an image that can't be read, since it could
+        never be recognized as unchanged.
+
+        Args:
+            path    str:           The path to an image passed to `lookup`.
+            circles numpy.ndarray: An Nx3 array of (x, y, r) rows.
+        """
+
+        fingerprint = self.__fingerprints.get(path)
+        if fingerprint is None:
+            fingerprint = self.__fingerprint(path)
+        if fingerprint is None:
+            self.__entries.pop(path, None)
+            return
+
+        self.__entries[path] = {
+            'fingerprint': fingerprint,
+            'circles': np.asarray(circles).tolist()
+        }
+
+    def save(self, paths):
+        """Writes the record to disk, forgetting images that are gone.
+
+        Args:
+            paths [str]: The images that are still part of the record.
+        """
+
+        entries = {}
+        for path in paths:
+            if path in self.__entries:
+                entries[path] = self.__entries[path]
+
+        # write beside the record and swap it in so a crash can't corrupt it
+        staging = self.__path + '.tmp'
+        with open(staging, 'w') as f:
+            json.dump({'parameters': self.__parameters, 'entries': entries}, f)
+        os.rename(staging, self.__path)
+
+    def __fingerprint(self, path):
+        # an image that is gone or unreadable is a miss, and the extractor
+        # reports it once it fails to decode it
+        try:
+            if not self.__checksum:
+                info = os.stat(path)
+                return [info.st_size, info.st_mtime]
+
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            return [digest.hexdigest()]
+        except (IOError, OSError):
+            return None
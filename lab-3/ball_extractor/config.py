@@ -22,10 +22,42 @@ class ConfigParser:
         if err: return None, err
 
         # override defaults
-        defaults = {'files': [], 'directories': [], 'output': ['./results']}
+        defaults = {
+            'files': [],
+            'directories': [],
+            'video': None,
+            'output': ['./results'],
+            'workers': 1,
+            'scale': 1,
+            'refine': False,
+            'quality': 95,
+            'masks': True,
+            'summary': None,
+            'cache': False,
+            'checksum': False,
+            'recursive': False,
+            'include': None,
+            'exclude': None,
+            'sort': True,
+            'stats': None,
+            'stats_interval': 10
+        }
         config = defaults.copy()
         directory_handled = False
+        video_handled = False
         output_handled = False
+        workers_handled = False
+        scale_handled = False
+        refine_handled = False
+        quality_handled = False
+        masks_handled = False
+        summary_handled = False
+        cache_handled = False
+        checksum_handled = False
+        recursive_handled = False
+        sort_handled = False
+        stats_handled = False
+        stats_interval_handled = False
 
         for flag, values in arg_dict.iteritems():
             if flag == '-f' or flag == '--file':
@@ -36,6 +68,12 @@ class ConfigParser:
                     directory_handled = True
                 else:
                     config['directories'] = config['directories'] + values
+            elif flag == '-v' or flag == '--video':
+                if video_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                config['video'] = values[0]
+                video_handled = True
             elif flag == '-o' or flag == '--output':
                 if not output_handled:
                     config['output'] = values[0]
@@ -43,9 +81,113 @@ class ConfigParser:
                 else:
                     err = '*** Error: Invalid number of arguments! ***'
                     return None, err
+            elif flag == '-w' or flag == '--workers':
+                if workers_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                workers, err = self.__parse_count(values[0])
+                if err: return None, err
+                config['workers'] = workers
+                workers_handled = True
+            elif flag == '-s' or flag == '--scale':
+                if scale_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                scale, err = self.__parse_count(values[0])
+                if err: return None, err
+                config['scale'] = scale
+                scale_handled = True
+            elif flag == '--refine':
+                if refine_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                refine, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['refine'] = refine
+                refine_handled = True
+            elif flag == '-q' or flag == '--quality':
+                if quality_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                quality, err = self.__parse_count(values[0])
+                if err: return None, err
+                if quality > 100:
+                    err = '*** Error: `{}` is not a quality from 1 to 100! ***'
+                    return None, err.format(values[0])
+                config['quality'] = quality
+                quality_handled = True
+            elif flag == '-m' or flag == '--masks':
+                if masks_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                masks, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['masks'] = masks
+                masks_handled = True
+            elif flag == '-c' or flag == '--cache':
+                if cache_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                cache, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['cache'] = cache
+                cache_handled = True
+            elif flag == '--checksum':
+                if checksum_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                checksum, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['checksum'] = checksum
+                checksum_handled = True
+            elif flag == '-r' or flag == '--recursive':
+                if recursive_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                recursive, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['recursive'] = recursive
+                recursive_handled = True
+            elif flag == '-i' or flag == '--include':
+                config['include'] = (config['include'] or []) + values
+            elif flag == '-x' or flag == '--exclude':
+                config['exclude'] = (config['exclude'] or []) + values
+            elif flag == '--sort':
+                if sort_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                sort, err = self.__parse_switch(values[0])
+                if err: return None, err
+                config['sort'] = sort
+                sort_handled = True
+            elif flag == '--stats':
+                if stats_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                config['stats'] = values[0]
+                stats_handled = True
+            elif flag == '--stats-interval':
+                if stats_interval_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                interval, err = self.__parse_count(values[0])
+                if err: return None, err
+                config['stats_interval'] = interval
+                stats_interval_handled = True
+            elif flag == '--summary':
+                if summary_handled or len(values) != 1:
+                    err = '*** Error: Invalid number of arguments! ***'
+                    return None, err
+                config['summary'] = values[0]
+                summary_handled = True
             else:
                 err = '*** Error: Invalid argument `{}`! ***'
                 return None, err.format(flag)
+        if config['video'] is not None and (
+            config['files'] or config['directories']
+        ):
+            err = '*** Error: A video cannot be mixed with images! ***'
+            return None, err
         return config, None
 
     def usage(self):
@@ -76,6 +218,19 @@ class ConfigParser:
                 '\n                                          processor at once'
                 '\n                                          with one flag.'
                 '\n'
+                '\n             -v, --video     SOURCE       A video file or'
+                '\n                                          capture device,'
+                '\n                                          as an index or'
+                '\n                                          /dev/videoN, to'
+                '\n                                          process frames'
+                '\n                                          from as they are'
+                '\n                                          read. Frames are'
+                '\n                                          dropped when a'
+                '\n                                          device outpaces'
+                '\n                                          detection. Cannot'
+                '\n                                          be mixed with -f'
+                '\n                                          or -d.'
+                '\n'
                 '\n             -o, --output    PATH         Path to the'
                 '\n                                          directory that'
                 '\n                                          should be'
@@ -86,6 +241,98 @@ class ConfigParser:
                 '\n                                          will be made to'
                 '\n                                          create it.'
                 '\n'
+                '\n             -w, --workers   COUNT        Number of'
+                '\n                                          processes to'
+                '\n                                          spread images'
+                '\n                                          across. Default'
+                '\n                                          is 1.'
+                '\n'
+                '\n             -s, --scale     FACTOR       Search images'
+                '\n                                          this many times'
+                '\n                                          smaller first,'
+                '\n                                          then refine at'
+                '\n                                          full resolution.'
+                '\n                                          Default is 1.'
+                '\n'
+                '\n                 --refine    on|off       Refine centers'
+                '\n                                          to sub-pixel'
+                '\n                                          accuracy from the'
+                '\n                                          mask. Default is'
+                '\n                                          off.'
+                '\n'
+                '\n             -q, --quality   QUALITY      JPEG quality of'
+                '\n                                          the results from'
+                '\n                                          1 to 100. Default'
+                '\n                                          is 95.'
+                '\n'
+                '\n             -m, --masks     on|off       Whether masks are'
+                '\n                                          written next to'
+                '\n                                          the results.'
+                '\n                                          Default is on.'
+                '\n'
+                '\n                 --summary   FILE         Write every circle'
+                '\n                                          to a single CSV'
+                '\n                                          file in the'
+                '\n                                          output directory'
+                '\n                                          instead of'
+                '\n                                          writing images.'
+                '\n'
+                '\n             -c, --cache     on|off       Reuse the results'
+                '\n                                          of images that'
+                '\n                                          have not changed'
+                '\n                                          since the last'
+                '\n                                          run. Default is'
+                '\n                                          off.'
+                '\n'
+                '\n                 --checksum  on|off       Compare image'
+                '\n                                          contents rather'
+                '\n                                          than size and'
+                '\n                                          modification time'
+                '\n                                          when caching.'
+                '\n                                          Default is off.'
+                '\n'
+                '\n             -r, --recursive on|off       Search'
+                '\n                                          directories'
+                '\n                                          recursively.'
+                '\n                                          Default is off.'
+                '\n'
+                '\n             -i, --include   PATTERN      Only process'
+                '\n                                          files in'
+                '\n                                          directories whose'
+                '\n                                          names match a'
+                '\n                                          glob pattern. Can'
+                '\n                                          be passed many'
+                '\n                                          times.'
+                '\n'
+                '\n             -x, --exclude   PATTERN      Skip files and'
+                '\n                                          directories whose'
+                '\n                                          names match a'
+                '\n                                          glob pattern. Can'
+                '\n                                          be passed many'
+                '\n                                          times.'
+                '\n'
+                '\n                 --sort      on|off       Sort every path'
+                '\n                                          before processing'
+                '\n                                          rather than'
+                '\n                                          processing images'
+                '\n                                          as they are'
+                '\n                                          found. Default is'
+                '\n                                          on.'
+                '\n'
+                '\n                 --stats     FILE         Time every stage'
+                '\n                                          and count frames'
+                '\n                                          and circles,'
+                '\n                                          appending JSON'
+                '\n                                          lines to FILE, or'
+                '\n                                          printing a table'
+                '\n                                          if FILE is -.'
+                '\n'
+                '\n                 --stats-interval SECONDS Seconds between'
+                '\n                                          dumps of the'
+                '\n                                          statistics during'
+                '\n                                          a run. Default is'
+                '\n                                          10.'
+                '\n'
                 '\n             -h, --help                   Show this help'
                 '\n                                          message and exit.')
 
@@ -101,6 +348,23 @@ class ConfigParser:
                 print('\n{}\n'.format(self.usage()))
                 exit(0)
 
+    def __parse_count(self, value):
+        try:
+            count = int(value)
+        except ValueError:
+            count = 0
+
+        if count < 1:
+            err = '*** Error: `{}` is not a positive integer! ***'
+            return None, err.format(value)
+        return count, None
+
+    def __parse_switch(self, value):
+        if value not in ('on', 'off'):
+            err = '*** Error: `{}` is not `on` or `off`! ***'
+            return None, err.format(value)
+        return value == 'on', None
+
     def __build_arg_dict(self, args):
         # extract configuration
         flags = []
@@ -0,0 +1,121 @@
+"""Collects the circles found across a batch of images."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import numpy as np
+
+class Detections:
+    """Describes every circle found by a ball extractor, one row per circle.
+
+    Rows are kept in a NumPy structured array with the fields `x`, `y`, `r`
+    and `source`, where `source` indexes into `sources()`. Images without a
+    detection still get a source index but contribute no rows.
+    """
+
+    DTYPE = np.dtype([
+        ('x', np.float32),
+        ('y', np.float32),
+        ('r', np.float32),
+        ('source', np.int32)
+    ])
+
+    def __init__(self):
+        """Initializes an empty set of detections."""
+
+        self.__sources = []
+        self.__chunks = []
+        self.__rows = np.empty(0, dtype=self.DTYPE)
+
+    def __len__(self):
+        return len(self.array())
+
+    def append(self, source, circles):
+        """Records the circles found in an image.
+
+        Args:
+            source  str:           The path to the image.
+            circles numpy.ndarray: An Nx3 array of (x, y, r) rows.
+
+        Returns:
+            int: The source index assigned to the image.
+        """
+
+        index = len(self.__sources)
+        self.__sources.append(source)
+
+        circles = np.asarray(circles, dtype=np.float32).reshape(-1, 3)
+        if len(circles):
+            chunk = np.empty(len(circles), dtype=self.DTYPE)
+            chunk['x'] = circles[:, 0]
+            chunk['y'] = circles[:, 1]
+            chunk['r'] = circles[:, 2]
+            chunk['source'] = index
+            self.__chunks.append(chunk)
+        return index
+
+    def sources(self):
+        """Accessor to the images that were processed.
+
+        Returns:
+            [str]: The image paths, in source index order.
+        """
+
+        return list(self.__sources)
+
+    def array(self):
+        """Accessor to every detection.
+
+        Returns:
+            numpy.ndarray: A structured array of `DTYPE` rows, ordered by
+                           source index.
+        """
+
+        if self.__chunks:
+            self.__rows = np.concatenate([self.__rows] + self.__chunks)
+            self.__chunks = []
+        return self.__rows
+
+    def circles(self):
+        """Accessor to the circles as plain floats.
+
+        Returns:
+            numpy.ndarray: An Nx3 array of (x, y, r) rows.
+        """
+
+        rows = self.array()
+        return np.column_stack((rows['x'], rows['y'], rows['r']))
+
+    def for_source(self, index):
+        """Fetches the detections belonging to a single image.
+
+        Args:
+            index int: A source index.
+
+        Returns:
+            numpy.ndarray: A structured array of `DTYPE` rows.
+        """
+
+        rows = self.array()
+        lo, hi = np.searchsorted(rows['source'], [index, index + 1])
+        return rows[lo:hi]
+
+    def best(self):
+        """Fetches the strongest detection of every image.
+
+        OpenCV orders circles by accumulator votes, so the first row of each
+        source is its strongest candidate.
+
+        Returns:
+            numpy.ndarray: A Kx3 array of (x, y, r) rows, one per source.
+                           Sources without a detection are filled with NaN.
+        """
+
+        rows = self.array()
+        best = np.full((len(self.__sources), 3), np.nan, dtype=np.float32)
+        sources, first = np.unique(rows['source'], return_index=True)
+        best[sources, 0] = rows['x'][first]
+        best[sources, 1] = rows['y'][first]
+        best[sources, 2] = rows['r'][first]
+        return best
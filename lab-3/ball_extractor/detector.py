@@ -0,0 +1,345 @@
+"""Detects a ping-pong ball in a single decoded frame."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import cv2
+import numpy as np
+
+class Detector:
+    """Describes the per-frame image processing stages of a ball extractor."""
+
+    BLUR = 11
+    MIN_DISTANCE = 120
+    EDGE_THRESHOLD = 60
+    VOTE_THRESHOLD = 30
+    MIN_RADIUS = 30
+    MAX_RADIUS = 180
+    REFINE_MARGIN = 2
+
+    def __init__(self):
+        """Initializes a detector."""
+
+        # YCrCb bounds
+        self.__low = np.array([60, 0, 0])
+        self.__high = np.array([255, 144, 129])
+
+        self.__buffers = {}
+        self.__stats = None
+
+    def __getstate__(self):
+        # scratch buffers are rebuilt on demand, don't ship them to workers,
+        # and each worker keeps statistics of its own
+        state = self.__dict__.copy()
+        state['_Detector__buffers'] = {}
+        state['_Detector__stats'] = None
+        return state
+
+    def instrument(self, stats):
+        """Times every stage of the detector from now on.
+
+        Args:
+            stats StageStats: Receives the timings, or `None` to stop timing.
+        """
+
+        self.__stats = stats
+
+    def signature(self):
+        """Describes the parameters that determine what gets detected.
+
+        Returns:
+            str: A string that changes whenever the parameters do.
+        """
+
+        return repr((
+            self.BLUR,
+            self.__low.tolist(),
+            self.__high.tolist(),
+            self.MIN_DISTANCE,
+            self.EDGE_THRESHOLD,
+            self.VOTE_THRESHOLD,
+            self.MIN_RADIUS,
+            self.MAX_RADIUS
+        ))
+
+    def load(self, path):
+        """Decodes an image from disk.
+
+        Args:
+            path str: The path to an image file.
+
+        Returns:
+            numpy.ndarray: The decoded BGR image, or `None` if it could not be
+                           read.
+        """
+
+        return cv2.imread(path)
+
+    def mask(self, raw, scale=1):
+        """Isolates the white regions of an image.
+
+        The frame is blurred and converted to YCrCb once. The luma channel of
+        that conversion, limited to the mask, is the input for circle
+        detection. Both outputs are views of scratch buffers owned by the
+        detector and are overwritten by the next call.
+
+        The original stage searched the unblurred frame instead, converted as
+        though it were YCrCb, so detections differ from it: on lab-3/images
+        centers move by up to about 4 px and radii by up to about 4.5 px.
+        `benchmarks/mask_allocations.py` compares the two.
+
+        Args:
+            raw   numpy.ndarray: A BGR image.
+            scale int:           How many times smaller `raw` is than a full
+                                 resolution frame, which shrinks the blur to
+                                 match. Default is 1.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): The grayscale input for circle
+                                            detection and the binary mask.
+        """
+
+        kernel = max(3, (self.BLUR // scale) | 1)
+        height, width = raw.shape[:2]
+        ycrcb = self.__buffer('ycrcb', (height, width, 3))
+        mask = self.__buffer('mask', (height, width))
+        masked = self.__buffer('masked', (height, width))
+
+        start = self.__start()
+        cv2.GaussianBlur(raw, (kernel, kernel), 0, dst=ycrcb)
+        start = self.__lap('blur', start)
+        cv2.cvtColor(ycrcb, cv2.COLOR_BGR2YCrCb, dst=ycrcb)
+        start = self.__lap('convert', start)
+        cv2.inRange(ycrcb, self.__low, self.__high, dst=mask)
+        cv2.extractChannel(ycrcb, 0, dst=masked)
+        cv2.bitwise_and(masked, mask, dst=masked)
+        self.__lap('threshold', start)
+        return masked, mask
+
+    def detect(self, masked, radii=None, scale=1):
+        """Searches a masked image for circles.
+
+        Args:
+            masked numpy.ndarray: The grayscale output of `mask`.
+            radii  (int, int):    Narrows the (minimum, maximum) radius that is
+                                  searched for. Default is `None`, which
+                                  searches the full range.
+            scale  int:           How many times smaller `masked` is than a
+                                  full resolution frame. Distances and radii
+                                  are shrunk to match, but circles are still
+                                  reported in `masked` coordinates. Default is
+                                  1.
+
+        Returns:
+            numpy.ndarray: An Nx3 array of (x, y, r) rows found by OpenCV's
+                           HoughCircle implementation, strongest first. Empty
+                           if nothing was found.
+        """
+
+        min_radius, max_radius = self.MIN_RADIUS, self.MAX_RADIUS
+        if radii is not None:
+            min_radius = max(min_radius, radii[0])
+            max_radius = min(max_radius, radii[1])
+
+        start = self.__start()
+        circles = cv2.HoughCircles(
+            image=masked,
+            method=cv2.HOUGH_GRADIENT,
+            dp=1,
+            minDist=float(self.MIN_DISTANCE) / scale,
+            param1=self.EDGE_THRESHOLD,
+            param2=self.VOTE_THRESHOLD,
+            minRadius=min_radius // scale,
+            maxRadius=-(-max_radius // scale)
+        )
+        self.__lap('hough', start)
+
+        if circles is None:
+            return np.empty((0, 3), dtype=np.float32)
+        return circles.reshape(-1, 3)
+
+    def draw(self, circles, img):
+        """Annotates an image with a set of circles and their centers.
+
+        Args:
+            circles numpy.ndarray: The output of `detect`.
+            img     numpy.ndarray: The image to draw on.
+        """
+
+        start = self.__start()
+        for x, y, r in np.around(circles).astype(int):
+            cv2.circle(img, (int(x), int(y)), int(r), (0, 255, 0), 2)
+            cv2.circle(img, (int(x), int(y)), 2, (0, 0, 255), 3)
+        self.__lap('draw', start)
+
+    def refine(self, circles, mask):
+        """Moves the center of each circle to the centroid of its mask.
+
+        Hough centers are quantized to the accumulator, so each center is
+        replaced by the first moments of the mask pixels within a couple of
+        pixels of its circle. Every circle is measured at once from a window
+        around it, never from the whole frame.
+
+        Args:
+            circles numpy.ndarray: The output of `detect` in `mask`
+                                   coordinates.
+            mask    numpy.ndarray: The unannotated binary mask of the frame.
+
+        Returns:
+            numpy.ndarray: A copy of `circles` with sub-pixel centers. Circles
+                           that touch the edge of the frame or whose mask
+                           covers less than a quarter of them are left as
+                           they were.
+        """
+
+        circles = np.array(circles, dtype=np.float32).reshape(-1, 3)
+        if not len(circles):
+            return circles
+        start = self.__start()
+
+        height, width = mask.shape[:2]
+        reach = circles[:, 2] + self.REFINE_MARGIN
+        span = int(np.ceil(reach.max()))
+        offsets = np.arange(-span, span + 2)
+
+        # a KxS grid of the columns and rows around each circle
+        xs = np.floor(circles[:, :1]).astype(np.intp) + offsets
+        ys = np.floor(circles[:, 1:2]).astype(np.intp) + offsets
+        window = mask[
+            np.clip(ys, 0, height - 1)[:, :, None],
+            np.clip(xs, 0, width - 1)[:, None, :]
+        ] > 0
+
+        dx = xs - circles[:, :1]
+        dy = ys - circles[:, 1:2]
+        window &= (
+            dx[:, None, :] ** 2 + dy[:, :, None] ** 2 <=
+            (reach ** 2)[:, None, None]
+        )
+
+        # a ball cut off by the edge of the frame would drag its centroid in
+        found = (
+            (circles[:, 0] - reach >= 0) &
+            (circles[:, 0] + reach <= width - 1) &
+            (circles[:, 1] - reach >= 0) &
+            (circles[:, 1] + reach <= height - 1)
+        )
+        area = window.sum(axis=(1, 2))
+        found &= area >= np.pi * circles[:, 2] ** 2 / 4
+        area = np.maximum(area, 1).astype(np.float64)
+        x = (window.sum(axis=1) * xs).sum(axis=1) / area
+        y = (window.sum(axis=2) * ys).sum(axis=1) / area
+        circles[found, 0] = x[found]
+        circles[found, 1] = y[found]
+        self.__lap('refine', start)
+        return circles
+
+    def process(self, raw, region=None, radii=None, scale=1, refine=False):
+        """Runs every stage on a frame, annotating it in place.
+
+        Args:
+            raw    numpy.ndarray:        A BGR image.
+            region (int, int, int, int): Restricts every stage to the
+                                         (x0, y0, x1, y1) bounds of the frame.
+                                         Default is `None`, which searches the
+                                         whole frame.
+            radii  (int, int):           Narrows the radius range, see
+                                         `detect`. Default is `None`.
+            scale  int:                  Searches a copy of the frame this many
+                                         times smaller first, then refines
+                                         each candidate in a small window of
+                                         the full resolution frame. Ignored
+                                         when `region` is given. Default is 1.
+            refine bool:                 Whether centers are refined to
+                                         sub-pixel accuracy, see `refine`.
+                                         Default is `False`.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): The circles found and the annotated
+                                            binary mask.
+        """
+
+        if region is not None:
+            circles, cropped = self.__search(raw, region, radii)
+            x0, y0, x1, y1 = region
+            mask = np.zeros(raw.shape[:2], dtype=np.uint8)
+            mask[y0:y1, x0:x1] = cropped
+        elif scale > 1:
+            circles, mask = self.__pyramid(raw, scale)
+        else:
+            masked, mask = self.mask(raw)
+            circles = self.detect(masked, radii)
+
+        if refine:
+            circles = self.refine(circles, mask)
+
+        self.draw(circles, raw)
+        self.draw(circles, mask)
+        return circles, mask
+
+    def __search(self, raw, region, radii):
+        x0, y0, x1, y1 = region
+        masked, mask = self.mask(raw[y0:y1, x0:x1])
+        circles = self.detect(masked, radii)
+        circles[:, 0] += x0
+        circles[:, 1] += y0
+        return circles, mask
+
+    def __pyramid(self, raw, scale):
+        height, width = raw.shape[:2]
+        size = (width // scale, height // scale)
+        small = self.__buffer('small', (size[1], size[0], 3))
+        start = self.__start()
+        cv2.resize(raw, size, dst=small, interpolation=cv2.INTER_AREA)
+        self.__lap('resize', start)
+
+        masked, mask = self.mask(small, scale)
+        candidates = self.detect(masked, None, scale) * scale
+        mask = cv2.resize(
+            mask,
+            (width, height),
+            interpolation=cv2.INTER_NEAREST
+        )
+
+        # each candidate is only accurate to within `scale` pixels, so look
+        # again at full resolution just around it
+        circles = np.empty_like(candidates)
+        for i, (x, y, r) in enumerate(candidates):
+            slack = 2 * scale
+            reach = r + slack + 8
+            region = (
+                max(0, int(x - reach)),
+                max(0, int(y - reach)),
+                min(width, int(x + reach) + 1),
+                min(height, int(y + reach) + 1)
+            )
+            radii = (int(r - slack), int(r + slack) + 1)
+            refined, cropped = self.__search(raw, region, radii)
+            circles[i] = refined[0] if len(refined) else (x, y, r)
+
+            # keep the full resolution mask so refinement can use it
+            x0, y0, x1, y1 = region
+            mask[y0:y1, x0:x1] = cropped
+        return circles, mask
+
+    def __start(self):
+        # timing is skipped entirely unless instrumented
+        if self.__stats is None:
+            return None
+        return self.__stats.start()
+
+    def __lap(self, stage, start):
+        if start is None:
+            return None
+        return self.__stats.lap(stage, start)
+
+    def __buffer(self, name, shape):
+        # grow a flat buffer as needed and hand out a contiguous view of it, so
+        # differently sized regions of interest share one allocation
+        size = int(np.prod(shape))
+        buf = self.__buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = np.empty(size, dtype=np.uint8)
+            self.__buffers[name] = buf
+        return buf[:size].reshape(shape)
@@ -10,11 +10,73 @@ __credits__ = ['Mike Nystoriak']
 
 import sys
 import os
+import shutil
+import threading
+import multiprocessing
 import cv2
-import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from path import PathAccumulator
 from config import ConfigParser
+from detector import Detector
+from detections import Detections
+from region import RegionTracker
+from writer import ResultWriter, output_paths, write_frame
+from cache import DetectionCache
+from stats import StageStats
+from source import FrameSource, open_source
+
+# state shared by every frame handled in a worker process
+_worker = {}
+
+def _init_worker(detector, scale, refine, options, instrument):
+    # one OpenCV thread per process so workers don't oversubscribe the cores
+    cv2.setNumThreads(1)
+    _worker['detector'] = detector
+    _worker['scale'] = scale
+    _worker['refine'] = refine
+    _worker['options'] = options
+    _worker['stats'] = StageStats() if instrument else None
+    detector.instrument(_worker['stats'])
+
+def _process_path(item):
+    path, cached, name = item
+    if cached is not None:
+        return path, cached, None, None, None
+
+    detector = _worker['detector']
+    stats = _worker['stats']
+    start = stats.start() if stats is not None else None
+    raw = detector.load(path)
+    if stats is not None:
+        start = stats.lap('decode', start)
+    if raw is None:
+        return path, None, None, None, _worker_snapshot()
+    circles, mask = detector.process(
+        raw,
+        scale=_worker['scale'],
+        refine=_worker['refine']
+    )
+    if stats is not None:
+        start = stats.lap('process', start)
+    if _worker['options'] is not None:
+        write_frame(_worker['options'], path, raw, mask, name)
+        if stats is not None:
+            stats.lap('write', start)
+    return path, circles, None, None, _worker_snapshot()
+
+def _worker_snapshot():
+    # hand the samples since the last frame over to the parent
+    stats = _worker['stats']
+    if stats is None:
+        return None
+    snapshot = stats.snapshot()
+    stats.reset()
+    return snapshot
 
 class BallExtractor:
     """Identifies and extracts a white ping-pong ball from an image."""
@@ -24,80 +86,430 @@ class BallExtractor:
 
         self.__path_accumulator = PathAccumulator(['.jpg', '.jpeg'])
         self.__config_parser = ConfigParser()
+        self.__detector = Detector()
+        self.__stats = None
 
-    def extract(self, srcs, dst='./out'):
+    def extract(
+        self,
+        srcs,
+        dst='./out',
+        lookahead=2,
+        workers=1,
+        track=False,
+        scale=1,
+        refine=False,
+        quality=95,
+        masks=True,
+        images=True,
+        summary=None,
+        cache=False,
+        checksum=False,
+        recursive=False,
+        include=None,
+        exclude=None,
+        sort=True,
+        stats=None
+    ):
         """Runs extraction procedure.
             
         Args:
-            srcs [str]: A list containing a series of filepaths to images that
-                        are staged for processing.
-            dst  str:   The output directory to house the results. Will be
-                        created if it does not currently exist. Default is
-                        './out'.
+            srcs      [str]:      A list containing a series of filepaths to
+                                  images that are staged for processing.
+            dst       str:        The output directory to house the results.
+                                  Will be created if it does not currently
+                                  exist. Default is './out'.
+            lookahead int:        The maximum number of frames decoded ahead of
+                                  the one being processed. Default is 2.
+            workers   int:        The number of processes that frames are
+                                  spread across. Default is 1.
+            track     bool:       Searches each frame near the previous
+                                  detection only, see `stream`. Default is
+                                  `False`.
+            scale     int:        Searches a copy of each frame this many times
+                                  smaller first, see `stream`. Default is 1.
+            refine    bool:       Whether centers are refined to sub-pixel
+                                  accuracy, see `stream`. Default is `False`.
+            quality   int:        The JPEG quality of the results, default is
+                                  95.
+            masks     bool:       Whether masks are written, default is `True`.
+            images    bool:       Whether annotated images are written, default
+                                  is `True`.
+            summary   str:        The name of a CSV file in `dst` that receives
+                                  every circle. Default is `None`.
+            cache     bool:       Whether unchanged images reuse the detections
+                                  of an earlier run, see `stream`. Default is
+                                  `False`.
+            checksum  bool:       Whether the cache compares image contents,
+                                  see `stream`. Default is `False`.
+            recursive bool:       Whether directories are searched recursively,
+                                  keeping their subdirectories in `dst`, see
+                                  `stream`. Default is `False`.
+            include   [str]:      Glob patterns that file names found in
+                                  directories must match one of, default is
+                                  `None`.
+            exclude   [str]:      Glob patterns for file and directory names to
+                                  skip, default is `None`.
+            sort      bool:       Whether images are processed in sorted order,
+                                  see `stream`. Default is `True`.
+            stats     StageStats: Receives timings and counts, see `stream`.
+                                  Default is `None`.
 
         Returns:
-            [[float]]: A list of circles found by OpenCV's HoughCircle
-                       implementation.
+            Detections: Every circle found, one row per (image, circle).
         """
 
-        def load_raws(srcs):
-            raws = []
-            for path in srcs:
-                img = cv2.imread(path)
-                raws.append(img)
-            return raws
-
-        def mask_raw(raw):
-            blur = cv2.GaussianBlur(raw, (11, 11), 0)
-            ycrcb = cv2.cvtColor(blur, cv2.COLOR_BGR2YCrCb)
-
-            # YCrCb bounds
-            low = np.array([60, 0, 0])
-            high = np.array([255, 144, 129])
-
-            mask = cv2.inRange(ycrcb, low, high)
-            masked = cv2.bitwise_and(raw, raw, mask=mask)
-            masked = cv2.cvtColor(masked, cv2.COLOR_YCrCb2RGB)
-            masked = cv2.cvtColor(masked, cv2.COLOR_RGB2GRAY)
-            return masked, mask
-
-        def draw_circles(circles, img):
-            if circles is not None:
-                circles = np.uint16(np.around(circles))
-                for [(x, y, r)] in circles:
-                    cv2.circle(img, (x, y), r, (0, 255, 0), 2)
-                    cv2.circle(img, (x, y), 2, (0, 0, 255), 3)
-
-        paths = self.__path_accumulator.path_walk(srcs)
-        raws = load_raws(paths)
-        results, result_masks = [], []
-
-        if os.path.isdir(dst):
-            for f in os.listdir(dst):
-                os.remove(os.path.join(dst, f))
-        else:
-            os.makedirs(dst)
+        detections = Detections()
+        frames = self.stream(
+            srcs,
+            dst,
+            lookahead=lookahead,
+            workers=workers,
+            track=track,
+            scale=scale,
+            refine=refine,
+            quality=quality,
+            masks=masks,
+            images=images,
+            summary=summary,
+            cache=cache,
+            checksum=checksum,
+            recursive=recursive,
+            include=include,
+            exclude=exclude,
+            sort=sort,
+            stats=stats
+        )
+        for path, circles in frames:
+            detections.append(path, circles)
+        return detections
 
-        for i in range(len(raws)):
-            masked, mask = mask_raw(raws[i])
-            circles = cv2.HoughCircles(
-                image=masked,
-                method=cv2.HOUGH_GRADIENT,
-                dp=1,
-                minDist=120,
-                param1=60,
-                param2=30,
-                minRadius=30,
-                maxRadius=180
+    def stream(
+        self,
+        srcs,
+        dst='./out',
+        lookahead=2,
+        workers=1,
+        track=False,
+        scale=1,
+        refine=False,
+        quality=95,
+        masks=True,
+        images=True,
+        summary=None,
+        cache=False,
+        checksum=False,
+        recursive=False,
+        include=None,
+        exclude=None,
+        sort=True,
+        stats=None
+    ):
+        """Runs extraction procedure one frame at a time.
+
+        Frames are decoded on a background thread at most `lookahead` frames
+        ahead of detection, so memory stays bounded regardless of how many
+        images are staged and results are available as soon as each frame has
+        been written.
+
+        Args:
+            srcs      [str]:      A list containing a series of filepaths to
+                                  images that are staged for processing.
+            dst       str:        The output directory to house the results.
+                                  Will be created if it does not currently
+                                  exist. `None` only detects, writing nothing
+                                  at all. Default is './out'.
+            lookahead int:        The maximum number of frames decoded ahead of
+                                  the one being processed. `0` decodes on the
+                                  calling thread. Ignored when `workers` is
+                                  greater than 1. Default is 2.
+            workers   int:        The number of processes that frames are
+                                  spread across. Results are still yielded in
+                                  path order. Default is 1.
+            track     bool:       Treats the images as a sequence and only
+                                  searches around where the ball is predicted
+                                  to be given its previous detections, falling
+                                  back to the whole frame whenever it is lost.
+                                  A `RegionTracker` may be passed instead, so
+                                  that the caller can `hint` it between frames.
+                                  Cannot be combined with `workers`. Default is
+                                  `False`.
+            scale     int:        Searches a copy of each frame this many times
+                                  smaller (2 or 4 work well) and then refines
+                                  every candidate in a small full resolution
+                                  window around it. Default is 1, which
+                                  searches at full resolution only.
+            refine    bool:       Whether the center of every circle is refined
+                                  to sub-pixel accuracy from the moments of the
+                                  mask inside it, which matters when the
+                                  centers are triangulated. Default is `False`.
+            quality   int:        The JPEG quality of the results, default is
+                                  95.
+            masks     bool:       Whether masks are written next to the
+                                  results, default is `True`.
+            images    bool:       Whether annotated images are written at all.
+                                  Images are encoded and written on background
+                                  threads. Default is `True`.
+            summary   str:        The name of a CSV file in `dst` that receives
+                                  the (source, x, y, r) of every circle, which
+                                  together with `images=False` replaces the 2N
+                                  images with a single file. Default is `None`.
+            cache     bool:       Whether detections are remembered in `dst` so
+                                  that a later run with the same settings only
+                                  decodes and processes images that changed.
+                                  Results of unchanged images are kept in place
+                                  instead of wiping `dst`. Ignored when
+                                  tracking, since every detection depends on
+                                  the frames before it. Default is `False`.
+            checksum  bool:       Whether the cache compares the contents of
+                                  images rather than their size and
+                                  modification time. Default is `False`.
+            recursive bool:       Whether directories are searched recursively,
+                                  default is `False`. The results of images
+                                  found in subdirectories are written to the
+                                  same subdirectories of `dst`.
+            include   [str]:      Glob patterns that file names found in
+                                  directories must match one of, default is
+                                  `None`.
+            exclude   [str]:      Glob patterns for file and directory names to
+                                  skip, default is `None`.
+            sort      bool:       Whether every path is gathered and sorted
+                                  before processing starts. `False` processes
+                                  images in the order they are discovered, so
+                                  the first results arrive before a large tree
+                                  has been fully listed. Default is `True`.
+            stats     StageStats: Receives the time spent in every stage of
+                                  every frame and counts of the frames and
+                                  circles, and is given the chance to dump them
+                                  after each frame. Default is `None`, which
+                                  measures nothing.
+
+        Yields:
+            (str, numpy.ndarray): The path to an image and an Nx3 array of the
+                                  (x, y, r) circles found in it.
+        """
+
+        if track and workers > 1:
+            raise ValueError('*** Error: Tracking needs frames in sequence and'
+                             ' cannot be spread across workers! ***')
+
+        if sort:
+            paths = self.__path_accumulator.path_walk(
+                srcs,
+                recursive,
+                include,
+                exclude
             )
-            draw_circles(circles, raws[i])
-            draw_circles(circles, mask)
+        else:
+            paths = self.__path_accumulator.walk(
+                srcs,
+                recursive,
+                include,
+                exclude
+            )
+
+        # without an output directory, only detect
+        if dst is None:
+            images, summary, cache = False, None, False
+
+        record = None
+        if cache and not track:
+            parameters = repr((
+                self.__detector.signature(),
+                scale,
+                refine,
+                quality,
+                masks,
+                images
+            ))
+            record = DetectionCache(dst, parameters, checksum)
+        if dst is not None:
+            self.__prepare_output(dst, record is None)
+
+        writer = ResultWriter(
+            dst,
+            quality,
+            masks,
+            images,
+            summary,
+            threads=0 if workers > 1 else 2,
+            stats=stats
+        )
+
+        self.__stats = stats
+        self.__detector.instrument(stats)
+
+        seen = []
+        items = self.__classify(paths, seen, record, dst, images, masks)
+        completed = False
+        try:
+            if workers > 1:
+                frames = self.__process_parallel(
+                    items,
+                    workers,
+                    scale,
+                    refine,
+                    writer.options(),
+                    stats
+                )
+            else:
+                tracker = None
+                if isinstance(track, RegionTracker):
+                    tracker = track
+                elif track:
+                    tracker = RegionTracker()
+                frames = self.__process_serial(
+                    items,
+                    lookahead,
+                    tracker,
+                    scale,
+                    refine
+                )
+
+            for path, circles, raw, mask in frames:
+                if circles is None:
+                    print('*** WARN: `{}` could not be decoded!'
+                          ' Skipping... ***'.format(path))
+                    if stats is not None:
+                        stats.count('undecodable')
+                    continue
+                writer.write(
+                    path,
+                    circles,
+                    raw,
+                    mask,
+                    self.__path_accumulator.name(path)
+                )
+                if record is not None:
+                    record.store(path, circles)
+                if stats is not None:
+                    stats.frame(len(circles))
+                    stats.tick()
+                yield path, circles
+            completed = True
+        finally:
+            self.__stats = None
+            self.__detector.instrument(None)
+            writer.close()
+            if record is not None:
+                record.save(seen)
+                if completed:
+                    self.__reconcile_output(dst, seen, summary)
+
+    def capture(
+        self,
+        source,
+        dst=None,
+        track=False,
+        scale=1,
+        refine=False,
+        quality=95,
+        masks=True,
+        images=True,
+        summary=None,
+        stats=None
+    ):
+        """Runs extraction procedure on frames as they arrive from a source.
+
+        Frames are read on a background thread by the source, so a camera
+        keeps being grabbed while a frame is processed. Only the latest few
+        frames are buffered, and the rest are dropped, see `CaptureSource`.
+
+        Args:
+            source  FrameSource|int|str: The frames, or a capture device,
+                                         video file, image or directory that
+                                         `open_source` makes a source of and
+                                         closes once done.
+            dst     str:                 The output directory to house the
+                                         results, see `stream`. Results
+                                         already in it are kept. Default is
+                                         `None`, which only detects.
+            track   bool:                Searches each frame near the previous
+                                         detection only, see `stream`.
+                                         Default is `False`.
+            scale   int:                 Searches a copy of each frame this
+                                         many times smaller first, see
+                                         `stream`. Default is 1.
+            refine  bool:                Whether centers are refined to
+                                         sub-pixel accuracy, see `stream`.
+                                         Default is `False`.
+            quality int:                 The JPEG quality of the results,
+                                         default is 95.
+            masks   bool:                Whether masks are written, default is
+                                         `True`.
+            images  bool:                Whether annotated images are written,
+                                         default is `True`.
+            summary str:                 The name of a CSV file in `dst` that
+                                         receives every circle. Default is
+                                         `None`.
+            stats   StageStats:          Receives timings and counts, see
+                                         `stream`, as well as the number of
+                                         `dropped` frames. Default is `None`.
+
+        Yields:
+            (str, float, numpy.ndarray): The name of a frame, its timestamp in
+                                         seconds and an Nx3 array of the
+                                         (x, y, r) circles found in it.
+        """
+
+        owned = not isinstance(source, FrameSource)
+        if owned:
+            source = open_source(source)
+
+        if dst is None:
+            images, summary = False, None
+        else:
+            self.__prepare_output(dst, False)
 
-            circles_list = circles.tolist()
-            results.append(raws[i])
-            result_masks.append(mask)
-            self.__save_image(paths[i], dst, raws[i], mask)
-        return circles_list[0]
+        tracker = None
+        if isinstance(track, RegionTracker):
+            tracker = track
+        elif track:
+            tracker = RegionTracker()
+
+        writer = ResultWriter(
+            dst,
+            quality,
+            masks,
+            images,
+            summary,
+            stats=stats
+        )
+
+        self.__detector.instrument(stats)
+        dropped = 0
+        try:
+            for name, timestamp, raw in source.frames():
+                if raw is None:
+                    print('*** WARN: `{}` could not be decoded!'
+                          ' Skipping... ***'.format(name))
+                    if stats is not None:
+                        stats.count('undecodable')
+                    continue
+
+                start = stats.start() if stats is not None else None
+                if tracker is None:
+                    circles, mask = self.__detector.process(
+                        raw,
+                        scale=scale,
+                        refine=refine
+                    )
+                else:
+                    circles, mask = self.__track(raw, tracker, scale, refine)
+                if stats is not None:
+                    stats.lap('process', start)
+
+                writer.write(name, circles, raw, mask)
+                if stats is not None:
+                    stats.count('dropped', source.dropped() - dropped)
+                    dropped = source.dropped()
+                    stats.frame(len(circles))
+                    stats.tick()
+                yield name, timestamp, circles
+        finally:
+            self.__detector.instrument(None)
+            writer.close()
+            if owned:
+                source.close()
 
     def prompt(self):
         """Runs a small command line interface."""
@@ -107,20 +519,264 @@ class BallExtractor:
             print('\n{}\n\n{}\n').format(err, self.__config_parser.usage())
             return
 
-        paths = self.__build_paths(configuration)
-        _ = self.extract(paths, configuration['output'])
+        stats = None
+        if configuration['stats'] is not None:
+            stats = StageStats(
+                configuration['stats_interval'],
+                configuration['stats']
+            )
+
+        if configuration['video'] is not None:
+            try:
+                for _ in self.capture(
+                    configuration['video'],
+                    configuration['output'],
+                    scale=configuration['scale'],
+                    refine=configuration['refine'],
+                    quality=configuration['quality'],
+                    masks=configuration['masks'],
+                    images=configuration['summary'] is None,
+                    summary=configuration['summary'],
+                    stats=stats
+                ):
+                    pass
+            except ValueError as e:
+                print('\n{}\n'.format(e))
+                return
+        else:
+            srcs = configuration['files'] + configuration['directories']
+            _ = self.extract(
+                srcs,
+                configuration['output'],
+                workers=configuration['workers'],
+                scale=configuration['scale'],
+                refine=configuration['refine'],
+                quality=configuration['quality'],
+                masks=configuration['masks'],
+                images=configuration['summary'] is None,
+                summary=configuration['summary'],
+                cache=configuration['cache'],
+                checksum=configuration['checksum'],
+                recursive=configuration['recursive'],
+                include=configuration['include'],
+                exclude=configuration['exclude'],
+                sort=configuration['sort'],
+                stats=stats
+            )
+        if stats is not None:
+            stats.dump()
+
+    def __prepare_output(self, dst, clear):
+        if not os.path.isdir(dst):
+            os.makedirs(dst)
+        elif clear:
+            for f in os.listdir(dst):
+                path = os.path.join(dst, f)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+    def __reconcile_output(self, dst, paths, summary):
+        # keep the results of the images just processed, clear the rest
+        keep = set([DetectionCache.FILENAME, summary])
+        for path in paths:
+            name = self.__path_accumulator.name(path)
+            for output in output_paths(path, dst, name):
+                keep.add(os.path.relpath(output, dst))
+
+        for directory, _, files in os.walk(dst, topdown=False):
+            for f in files:
+                path = os.path.join(directory, f)
+                if os.path.relpath(path, dst) not in keep:
+                    os.remove(path)
+            if directory != dst and not os.listdir(directory):
+                os.rmdir(directory)
+
+    def __claim(self, written, path):
+        # separate directories can still hold images of the same name
+        name = self.__path_accumulator.name(path)
+        if written.setdefault(name, path) != path:
+            raise ValueError(
+                '*** Error: `{}` and `{}` would both be written to `{}`!'
+                ' ***'.format(written[name], path, name)
+            )
+
+    def __classify(self, paths, seen, record, dst, images, masks):
+        # pair each path with its cached circles, if they are still usable
+        written = {}
+        if images and isinstance(paths, list):
+            # everything was listed up front, so fail before writing anything
+            for path in paths:
+                self.__claim(written, path)
+        for path in paths:
+            if images:
+                self.__claim(written, path)
+            seen.append(path)
+            cached = None
+            if record is not None:
+                cached = record.lookup(path)
+                if cached is not None and not self.__written(
+                    path,
+                    dst,
+                    images,
+                    masks
+                ):
+                    cached = None
+                if cached is not None and self.__stats is not None:
+                    self.__stats.count('cached')
+            yield path, cached
+
+    def __written(self, path, dst, images, masks):
+        if not images:
+            return True
+        result, masked = output_paths(
+            path,
+            dst,
+            self.__path_accumulator.name(path)
+        )
+        return os.path.isfile(result) and (not masks or os.path.isfile(masked))
+
+    def __process_serial(self, items, lookahead, tracker, scale, refine):
+        for path, raw, cached in self.__decode(items, lookahead):
+            if cached is not None:
+                yield path, cached, None, None
+                continue
+            if raw is None:
+                yield path, None, None, None
+                continue
+            stats = self.__stats
+            start = stats.start() if stats is not None else None
+            if tracker is None:
+                circles, mask = self.__detector.process(
+                    raw,
+                    scale=scale,
+                    refine=refine
+                )
+            else:
+                circles, mask = self.__track(raw, tracker, scale, refine)
+            if stats is not None:
+                stats.lap('process', start)
+            yield path, circles, raw, mask
+
+    def __track(self, raw, tracker, scale, refine):
+        region = tracker.window(raw.shape)
+        if region is not None:
+            circles, mask = self.__detector.process(
+                raw,
+                region,
+                tracker.radii(),
+                refine=refine
+            )
+            if len(circles):
+                tracker.update(circles)
+                return circles, mask
+
+        # lost the ball, so search everywhere
+        circles, mask = self.__detector.process(
+            raw,
+            scale=scale,
+            refine=refine
+        )
+        tracker.update(circles)
+        return circles, mask
+
+    def __process_parallel(
+        self,
+        items,
+        workers,
+        scale,
+        refine,
+        options,
+        stats
+    ):
+        pool = multiprocessing.Pool(
+            workers,
+            _init_worker,
+            (self.__detector, scale, refine, options, stats is not None)
+        )
+
+        # one frame per task keeps results flowing back in order
+        names = self.__path_accumulator.name
+        failures = []
+
+        def tasks():
+            # the pool feeds workers from a thread that would swallow errors
+            try:
+                for path, cached in items:
+                    yield path, cached, names(path)
+            except Exception as e:
+                failures.append(e)
+
+        try:
+            for frame in pool.imap(_process_path, tasks()):
+                if frame[4] is not None:
+                    stats.merge(frame[4])
+                yield frame[:4]
+            if failures:
+                raise failures[0]
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __decode(self, items, lookahead):
+        if lookahead < 1:
+            for item in items:
+                yield self.__load(item)
+            return
+
+        frames = queue.Queue(maxsize=lookahead)
+        stopped = threading.Event()
+
+        def put(item):
+            # give up once the consumer has gone away
+            while not stopped.is_set():
+                try:
+                    frames.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        failures = []
+
+        def read():
+            try:
+                for item in items:
+                    if not put(self.__load(item)):
+                        return
+            except Exception as e:
+                failures.append(e)
+            put(None)
+
+        reader = threading.Thread(target=read)
+        reader.daemon = True
+        reader.start()
 
-    def __save_image(self, src, dst, raw, mask):
-        [name, ext] = os.path.basename(src).split('.')
-        cv2.imwrite(os.path.join(dst, name + '.' + ext), raw)
-        cv2.imwrite(os.path.join(dst, name + '-mask.' + ext), mask)
-        print('Result: ' + os.path.join(dst, name + '.' + ext))
-        print('Mask  : ' + os.path.join(dst, name + '-mask.' + ext))
+        try:
+            while True:
+                item = frames.get()
+                if item is None:
+                    break
+                yield item
+            if failures:
+                raise failures[0]
+        finally:
+            stopped.set()
+            reader.join()
 
-    def __build_paths(self, config):
-        files = config['files']
-        directories = config['directories']
-        return self.__path_accumulator.path_walk(files + directories)
+    def __load(self, item):
+        # images with cached results are never decoded
+        path, cached = item
+        if cached is not None:
+            return path, None, cached
+        stats = self.__stats
+        if stats is None:
+            return path, self.__detector.load(path), None
+        start = stats.start()
+        raw = self.__detector.load(path)
+        stats.lap('decode', start)
+        return path, raw, None
 
 def main():
     ball_extractor = BallExtractor()
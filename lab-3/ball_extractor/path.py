@@ -5,6 +5,16 @@ __author__ = 'Mike Nystoriak'
 __credits__ = ['Mike Nystoriak']
 
 import os
+import stat
+import fnmatch
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 class PathAccumulator:
     """Describes a path accumulator."""
@@ -20,6 +30,7 @@ class PathAccumulator:
             ext[i] = ext[i].upper()
         self.__extensions = set(ext)
         self.__paths = set()
+        self.__names = {}
 
     def paths(self):
         """Accessor to the accumulated paths.
@@ -32,6 +43,20 @@ class PathAccumulator:
         output.sort()
         return output
 
+    def name(self, path):
+        """Names a gathered path relative to the directory it was found in.
+
+        Args:
+            path str: A normalized file path.
+
+        Returns:
+            str: The path relative to the directory that was searched to find
+                 it, so that it keeps any subdirectories it was found in, or
+                 its base name if it was gathered as a file.
+        """
+
+        return self.__names.get(path, os.path.basename(path))
+
     def normalize_prefix(self, path):
         """Normalizes a file prefix.
 
@@ -98,26 +123,151 @@ class PathAccumulator:
             print('*** WARN: `{}` does not exist!'
                   ' Skipping... ***'.format(path))
         else:
-            files = os.listdir(path)
-            for f in files:
-                self.gather_file(os.path.join(path, f))
+            for f in self.__scan(path, False, None, None):
+                self.__paths.add(f)
+                self.__names[f] = os.path.relpath(f, path)
 
-    def path_walk(self, paths = []):
+    def path_walk(self, paths=[], recursive=False, include=None, exclude=None):
         """Attempts to gather all files in a set of paths to directories and
         files if they exist and match a valid extention.
 
         Otherwise, the file will be skipped and a warning will be printed.
 
         Args:
-            path str: The path to a file.
+            paths     [str]: The paths to files and directories.
+            recursive bool:  Whether subdirectories are searched too, default
+                             is `False`.
+            include   [str]: Glob patterns that the names of files found in
+                             directories must match at least one of. Default
+                             is `None`, which matches every file.
+            exclude   [str]: Glob patterns for names of files and
+                             subdirectories to skip. Default is `None`.
+
+        Returns:
+            [str]: A sorted list of the normalized file paths gathered from
+                   `paths`.
+        """
+
+        output = list(self.walk(paths, recursive, include, exclude))
+        output.sort()
+        return output
+
+    def walk(self, paths=[], recursive=False, include=None, exclude=None):
+        """Lazily gathers all files in a set of paths to directories and files.
+
+        Paths are yielded as soon as they are discovered, in the order they
+        are found, and each one only once. Directories are listed with
+        `os.scandir` where available so that the file type of each entry comes
+        from the listing itself rather than another `stat`. Elsewhere, entries
+        are filtered by name first and the rest take a single `lstat` each.
+
+        Args:
+            paths     [str]: The paths to files and directories.
+            recursive bool:  Whether subdirectories are searched too, default
+                             is `False`.
+            include   [str]: Glob patterns that the names of files found in
+                             directories must match at least one of. Default
+                             is `None`, which matches every file.
+            exclude   [str]: Glob patterns for names of files and
+                             subdirectories to skip. Default is `None`.
+
+        Yields:
+            str: A normalized file path.
         """
 
         if type(paths) is str:
             paths = [paths]
 
+        seen = set()
         for p in paths:
-            if os.path.isdir(p):
-                self.gather_directory(p)
-            elif os.path.isfile(p):
-                self.gather_file(p)
-        return self.paths()
\ No newline at end of file
+            try:
+                mode = os.stat(p).st_mode
+            except OSError:
+                mode = 0
+
+            root = None
+            if stat.S_ISDIR(mode):
+                root = self.normalize_prefix(p)
+                found = self.__scan(root, recursive, include, exclude)
+            elif stat.S_ISREG(mode):
+                found = self.__gather_named_file(p)
+            else:
+                continue
+
+            for f in found:
+                if f not in seen:
+                    seen.add(f)
+                    self.__paths.add(f)
+                    if root is None:
+                        self.__names[f] = os.path.basename(f)
+                    else:
+                        self.__names[f] = os.path.relpath(f, root)
+                    yield f
+
+    def __gather_named_file(self, path):
+        path = self.normalize_prefix(path)
+        if not self.check_extension(path):
+            print('*** WARN: `{}` is not a JPG file!'
+                  ' Skipping... ***'.format(path))
+        else:
+            yield path
+
+    def __scan(self, root, recursive, include, exclude):
+        # walk with an explicit stack so deep trees can't hit the recursion
+        # limit, visiting each directory's files in listing order
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            subdirectories = []
+            try:
+                for name, path, kind in self.__list(directory):
+                    if exclude and self.__matches(name, exclude):
+                        continue
+                    # only entries that could be kept are looked at, which
+                    # without `scandir` costs a `stat` each
+                    wanted = self.check_extension(name) and (
+                        not include or self.__matches(name, include)
+                    )
+                    if not wanted and not recursive:
+                        continue
+                    is_dir, is_file = kind()
+                    if is_file and wanted:
+                        yield path
+                    elif is_dir and recursive:
+                        subdirectories.append(path)
+            except OSError:
+                print('*** WARN: `{}` could not be read!'
+                      ' Skipping... ***'.format(directory))
+
+            subdirectories.reverse()
+            directories.extend(subdirectories)
+
+    def __list(self, directory):
+        if scandir is None:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                yield name, path, lambda path=path: self.__kind(path)
+            return
+
+        for entry in scandir(directory):
+            yield entry.name, entry.path, lambda entry=entry: (
+                entry.is_dir(follow_symlinks=False),
+                entry.is_file()
+            )
+
+    def __kind(self, path):
+        # one `lstat` tells directories from files, and only links need more
+        try:
+            mode = os.lstat(path).st_mode
+            if stat.S_ISLNK(mode):
+                # links are followed to files but never into directories
+                return False, stat.S_ISREG(os.stat(path).st_mode)
+        except OSError:
+            return False, False
+        return stat.S_ISDIR(mode), stat.S_ISREG(mode)
+
+    def __matches(self, name, patterns):
+        for pattern in patterns:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
@@ -0,0 +1,119 @@
+"""Predicts the region of a frame that a moving ball will appear in."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+class RegionTracker:
+    """Describes a constant-velocity search window around the last detection.
+
+    The window is centered on where the ball would be if it kept the velocity
+    it had between the last two detections, and is padded by the ball's
+    radius, the distance it travelled and a fixed margin. Once the ball is
+    lost, no window is offered until it is found again by a full search, or
+    until a prediction is handed over with `hint`.
+    """
+
+    def __init__(self, margin=32, scale=1.5):
+        """Initializes a region tracker.
+
+        Args:
+            margin int:   Extra padding around the predicted ball in pixels,
+                          default is 32.
+            scale  float: Multiple of the ball radius the window must cover,
+                          default is 1.5.
+        """
+
+        self.__margin = margin
+        self.__scale = scale
+        self.reset()
+
+    def hint(self, x, y, r=None):
+        """Centers the next window on a prediction made elsewhere.
+
+        Useful when a better model of the motion is at hand, such as a
+        trajectory followed in 3D space. The hint is forgotten by `update`.
+
+        Args:
+            x float: The predicted x coordinate of the ball in pixels.
+            y float: The predicted y coordinate of the ball in pixels.
+            r float: The predicted radius of the ball in pixels. Default is
+                     `None`, which keeps the last radius seen.
+        """
+
+        if r is None:
+            if self.__last is None:
+                return
+            r = self.__last[2]
+        self.__hint = (float(x), float(y), float(r))
+
+    def window(self, shape):
+        """Fetches the region the next detection should be searched for in.
+
+        Args:
+            shape (int, int, ...): The shape of the next frame.
+
+        Returns:
+            (int, int, int, int): The (x0, y0, x1, y1) bounds of the region, or
+                                  `None` if the whole frame should be searched.
+        """
+
+        if self.__hint is not None:
+            cx, cy, r = self.__hint
+            reach = r * self.__scale + self.__margin
+        elif self.__last is not None:
+            x, y, r = self.__last
+            vx, vy = self.__velocity
+            cx, cy = x + vx, y + vy
+            reach = r * self.__scale + self.__margin + max(abs(vx), abs(vy))
+        else:
+            return None
+
+        height, width = shape[:2]
+        x0 = max(0, int(cx - reach))
+        y0 = max(0, int(cy - reach))
+        x1 = min(width, int(cx + reach) + 1)
+        y1 = min(height, int(cy + reach) + 1)
+        if x1 - x0 < 2 * r or y1 - y0 < 2 * r:
+            return None
+        return x0, y0, x1, y1
+
+    def radii(self):
+        """Fetches the radius range the next detection should fall within.
+
+        Returns:
+            (int, int): The (minimum, maximum) radius, or `None` if unknown.
+        """
+
+        if self.__hint is not None:
+            r = self.__hint[2]
+        elif self.__last is not None:
+            r = self.__last[2]
+        else:
+            return None
+        return int(r / self.__scale), int(r * self.__scale) + 1
+
+    def update(self, circles):
+        """Records the detections of the latest frame.
+
+        Args:
+            circles numpy.ndarray: An Nx3 array of (x, y, r) rows, strongest
+                                   first. An empty array marks the ball lost.
+        """
+
+        self.__hint = None
+        if not len(circles):
+            self.reset()
+            return
+
+        x, y, r = [float(v) for v in circles[0]]
+        if self.__last is not None:
+            self.__velocity = (x - self.__last[0], y - self.__last[1])
+        self.__last = (x, y, r)
+
+    def reset(self):
+        """Forgets the ball so the next frame is searched in full."""
+
+        self.__last = None
+        self.__velocity = (0.0, 0.0)
+        self.__hint = None
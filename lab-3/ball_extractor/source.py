@@ -0,0 +1,423 @@
+"""Reads frames for a ball extractor from images, videos and cameras."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import abc
+import threading
+from collections import deque
+
+import cv2
+
+from path import PathAccumulator
+from stats import clock
+
+def open_source(src, **kwargs):
+    """Opens the frame source that suits a description of one.
+
+    Args:
+        src    int|str: A capture device as an index or a path such as
+                        '/dev/video0', a video file, or an image file or
+                        directory of images.
+        kwargs dict:    Passed on to the source that is opened.
+
+    Returns:
+        FrameSource: The source.
+    """
+
+    if isinstance(src, str) and src.isdigit():
+        src = int(src)
+    if isinstance(src, int) or src.startswith('/dev/video'):
+        return CaptureSource(src, **kwargs)
+    images = PathAccumulator(['.jpg', '.jpeg'])
+    if os.path.isdir(src) or images.check_extension(src):
+        return ImageSource([src], **kwargs)
+    return CaptureSource(src, **kwargs)
+
+# a base class with a metaclass, spelled the same way on Python 2 and 3
+_Abstract = abc.ABCMeta('_Abstract', (object,), {})
+
+class FrameSource(_Abstract):
+    """Describes a sequence of frames, each with the time it was taken.
+
+    Sources must override `frames`, or they can't be instantiated.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @abc.abstractmethod
+    def frames(self):
+        """Reads the frames.
+
+        Yields:
+            (str, float, numpy.ndarray): A name for the frame that results
+                                         can be written under, its timestamp
+                                         in seconds and the BGR image, which
+                                         is `None` if it could not be
+                                         decoded.
+        """
+
+    def dropped(self):
+        """Accessor to the number of frames thrown away so far.
+
+        Returns:
+            int: The number of frames that were read but never yielded.
+        """
+
+        return 0
+
+    def close(self):
+        """Releases whatever the frames are read from."""
+
+class ImageSource(FrameSource):
+    """Describes a sequence of image files, read on the calling thread."""
+
+    def __init__(self, srcs, fps=None):
+        """Initializes an image source.
+
+        Args:
+            srcs [str]:  Image files and directories of images, gathered as
+                         by the ball extractor.
+            fps  float:  The rate the images were taken at, which times them
+                         by their position. Default is `None`, which takes
+                         the modification time of each file.
+        """
+
+        self.__srcs = srcs
+        self.__fps = fps
+
+    def frames(self):
+        """Reads the frames, see `FrameSource.frames`."""
+
+        paths = PathAccumulator(['.jpg', '.jpeg']).path_walk(self.__srcs)
+        for i, path in enumerate(paths):
+            if self.__fps is not None:
+                timestamp = i / float(self.__fps)
+            else:
+                timestamp = os.path.getmtime(path)
+            yield path, timestamp, cv2.imread(path)
+
+class FrameBuffer:
+    """Describes a ring buffer that hands frames from one thread to another.
+
+    When the buffer is full, either the oldest frame is thrown away to make
+    room, so the frames handed out are never more than `size` frames old
+    however slow the consumer gets, or the producer waits for room.
+    """
+
+    def __init__(self, size=4, drop=True):
+        """Initializes a frame buffer.
+
+        Args:
+            size int:  The number of frames held, default is 4.
+            drop bool: Whether the oldest frame is thrown away when the buffer
+                       is full rather than waiting for room. Default is
+                       `True`.
+        """
+
+        if size < 1:
+            raise ValueError('*** Error: Expected a buffer of at least one'
+                             ' frame! ***')
+
+        self.__frames = deque()
+        self.__size = size
+        self.__drop = drop
+        self.__dropped = 0
+        self.__finished = False
+        self.__stopped = False
+        self.__error = None
+        self.__ready = threading.Condition(threading.Lock())
+
+    def put(self, frame):
+        """Adds a frame, dropping or waiting if the buffer is full.
+
+        Args:
+            frame (str, float, numpy.ndarray): The frame, see
+                                               `FrameSource.frames`.
+
+        Returns:
+            bool: `False` once the consumer has stopped the buffer, so the
+                  producer can give up.
+        """
+
+        with self.__ready:
+            while (
+                len(self.__frames) >= self.__size and
+                not self.__drop and
+                not self.__stopped
+            ):
+                self.__ready.wait(0.1)
+            if self.__stopped:
+                return False
+            if len(self.__frames) >= self.__size:
+                self.__frames.popleft()
+                self.__dropped += 1
+            self.__frames.append(frame)
+            self.__ready.notify_all()
+            return True
+
+    def finish(self, error=None):
+        """Marks the end of the frames.
+
+        Args:
+            error Exception: Raised to the consumer once the frames before it
+                             have been read. Default is `None`.
+        """
+
+        with self.__ready:
+            self.__finished = True
+            self.__error = error
+            self.__ready.notify_all()
+
+    def stop(self):
+        """Throws away the frames left and turns the producer away."""
+
+        with self.__ready:
+            self.__stopped = True
+            self.__frames.clear()
+            self.__ready.notify_all()
+
+    def frames(self):
+        """Takes frames out of the buffer until it is finished or stopped.
+
+        Yields:
+            (str, float, numpy.ndarray): The frames, oldest first.
+        """
+
+        while True:
+            with self.__ready:
+                while (
+                    not self.__frames and
+                    not self.__finished and
+                    not self.__stopped
+                ):
+                    self.__ready.wait(0.1)
+                if not self.__frames:
+                    break
+                frame = self.__frames.popleft()
+                self.__ready.notify_all()
+            yield frame
+
+        if self.__error is not None and not self.__stopped:
+            error, self.__error = self.__error, None
+            raise error
+
+    def dropped(self):
+        """Accessor to the number of frames thrown away to make room.
+
+        Returns:
+            int: The number of frames dropped.
+        """
+
+        return self.__dropped
+
+class CaptureSource(FrameSource):
+    """Describes a video file or capture device read through OpenCV.
+
+    Frames are grabbed on a background thread into a `FrameBuffer` of a few
+    frames. When the consumer falls behind a live device, the oldest frame
+    is thrown away to make room, so latency stays bounded however slow
+    detection gets. Video files are instead read no faster than they are
+    consumed, since nothing is lost by waiting.
+    """
+
+    def __init__(self, src, buffer=4, drop=None, size=None, fps=None):
+        """Initializes a capture source and starts grabbing frames.
+
+        Args:
+            src    int|str:    A capture device as an index or a path such as
+                               '/dev/video0', or a video file.
+            buffer int:        The number of frames held for the consumer,
+                               default is 4.
+            drop   bool:       Whether the oldest frame is thrown away when
+                               the buffer is full rather than waiting for
+                               room. Default is `None`, which drops frames of
+                               capture devices only.
+            size   (int, int): The width and height asked of a capture device.
+                               Default is `None`, which keeps its own.
+            fps    float:      The frame rate asked of a capture device.
+                               Default is `None`, which keeps its own.
+        """
+
+        live = isinstance(src, int) or str(src).startswith('/dev/')
+        frames = FrameBuffer(buffer, live if drop is None else drop)
+        if not live and not os.path.isfile(src):
+            raise ValueError(
+                '*** Error: Could not find video {}! ***'.format(src)
+            )
+
+        capture = cv2.VideoCapture(src)
+        if not capture.isOpened():
+            raise ValueError(
+                '*** Error: Could not open video {}! ***'.format(src)
+            )
+        if size is not None:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        if fps is not None:
+            capture.set(cv2.CAP_PROP_FPS, fps)
+
+        if isinstance(src, int):
+            self.__name = 'video{}'.format(src)
+        else:
+            self.__name = os.path.splitext(os.path.basename(src))[0]
+        self.__live = live
+        self.__fps = capture.get(cv2.CAP_PROP_FPS) or None
+        self.__capture = capture
+        self.__frames = frames
+
+        self.__thread = threading.Thread(target=self.__grab)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def frames(self):
+        """Reads the frames, see `FrameSource.frames`.
+
+        Frames of a capture device are timed by `stats.clock` as they are
+        grabbed, and frames of a video file by their position in it.
+        """
+
+        return self.__frames.frames()
+
+    def dropped(self):
+        """Accessor to the number of frames thrown away, see `FrameSource`."""
+
+        return self.__frames.dropped()
+
+    def live(self):
+        """Accessor to whether frames come from a capture device.
+
+        Returns:
+            bool: `True` for a capture device, `False` for a video file.
+        """
+
+        return self.__live
+
+    def fps(self):
+        """Accessor to the frame rate reported by OpenCV.
+
+        Returns:
+            float: The frames per second, or `None` if unknown.
+        """
+
+        return self.__fps
+
+    def close(self):
+        """Stops grabbing frames and releases the video."""
+
+        self.__frames.stop()
+        self.__thread.join()
+        self.__capture.release()
+
+    def __grab(self):
+        index = 0
+        error = None
+        try:
+            while True:
+                ok, raw = self.__capture.read()
+                if not ok:
+                    break
+                name = '{}-{:06d}.jpg'.format(self.__name, index)
+                frame = (name, self.__timestamp(index), raw)
+                index += 1
+                if not self.__frames.put(frame):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            self.__frames.finish(error)
+
+    def __timestamp(self, index):
+        if self.__live:
+            return clock()
+        position = self.__capture.get(cv2.CAP_PROP_POS_MSEC)
+        if position > 0 or not self.__fps:
+            return position / 1000.0
+        return index / self.__fps
+
+class ReplaySource(FrameSource):
+    """Describes a fake camera that plays recorded frames in real time.
+
+    The frames of another source are handed out at a fixed rate and timed by
+    the `stats.clock` time they are due, as a capture device times them by
+    when they were taken, so that live processing can be tried and measured
+    offline. Frames the consumer is too slow for are dropped as with a
+    capture device.
+    """
+
+    def __init__(self, source, fps=30.0, loop=1, buffer=4, start=None):
+        """Initializes a replay source and starts playing frames.
+
+        Args:
+            source FrameSource: The recorded frames, such as an `ImageSource`
+                                or a `CaptureSource` of a video file.
+            fps    float:       The rate frames are played at, default is 30.
+            loop   int:         The number of times the frames are played,
+                                which needs a source that can be read more
+                                than once, such as an `ImageSource`. Default
+                                is 1.
+            buffer int:         The number of frames held for the consumer,
+                                default is 4.
+            start  float:       The `stats.clock` time the first frame is
+                                played at, which lets several replays play in
+                                step. Default is `None`, which starts now.
+        """
+
+        if fps <= 0:
+            raise ValueError('*** Error: The frame rate must be'
+                             ' positive! ***')
+
+        self.__source = source
+        self.__fps = float(fps)
+        self.__loop = loop
+        self.__start = clock() if start is None else start
+        self.__frames = FrameBuffer(buffer, True)
+        self.__stopped = threading.Event()
+
+        self.__thread = threading.Thread(target=self.__play)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def frames(self):
+        """Reads the frames, see `FrameSource.frames`."""
+
+        return self.__frames.frames()
+
+    def dropped(self):
+        """Accessor to the number of frames thrown away, see `FrameSource`."""
+
+        return self.__frames.dropped() + self.__source.dropped()
+
+    def close(self):
+        """Stops playing frames and closes the recorded source."""
+
+        self.__stopped.set()
+        self.__frames.stop()
+        self.__thread.join()
+        self.__source.close()
+
+    def __play(self):
+        index = 0
+        error = None
+        try:
+            for _ in range(self.__loop):
+                for name, _, raw in self.__source.frames():
+                    # wait for the frame's turn, as a camera would, and
+                    # time it by its turn so replays in step pair exactly
+                    due = self.__start + index / self.__fps
+                    delay = due - clock()
+                    if delay > 0 and self.__stopped.wait(delay):
+                        return
+                    index += 1
+                    if not self.__frames.put((name, due, raw)):
+                        return
+        except Exception as e:
+            error = e
+        finally:
+            self.__frames.finish(error)
@@ -0,0 +1,351 @@
+"""Times the stages of a ball extractor and counts what it finds."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import sys
+import json
+import math
+import time
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# the `who` of `getrusage` for the calling thread, which Python 2 doesn't name
+RUSAGE_THREAD = 1
+
+def _thread_usage():
+    usage = resource.getrusage(RUSAGE_THREAD)
+    return usage.ru_utime + usage.ru_stime
+
+def _cpu_clock():
+    # stages run on decode, detection and writer threads at once, so only the
+    # CPU time of the calling thread can be put down to a stage, never the
+    # process-wide time of `time.clock` or `time.process_time`
+    if hasattr(time, 'thread_time'):
+        return time.thread_time
+    if resource is not None and sys.platform.startswith('linux'):
+        try:
+            _thread_usage()
+            return _thread_usage
+        except (ValueError, OSError):
+            pass
+    return None
+
+# `None` where the CPU time of a single thread can't be measured
+cpu_clock = _cpu_clock()
+
+class StageStats:
+    """Describes histograms of the time spent in every stage of extraction.
+
+    Wall and CPU times are bucketed by powers of two of microseconds, so
+    recording a sample costs the same however long a run gets. Samples may be
+    recorded from any thread. CPU time is that of the thread that ran the
+    stage, and is not recorded at all where the interpreter can't measure a
+    single thread, see `cpu_clock`. Alongside the stages, the number of
+    frames, the frames without a detection and the number of circles per
+    frame are counted.
+    """
+
+    BUCKETS = 25
+
+    # fields of a snapshot that the table always lays out
+    __STANDARD = (
+        'frames',
+        'empty',
+        'cached',
+        'undecodable',
+        'dropped',
+        'elapsed',
+        'circles',
+        'stages'
+    )
+
+    def __init__(self, interval=None, sink=None):
+        """Initializes a set of stage statistics.
+
+        Args:
+            interval float: How many seconds apart the statistics are dumped
+                            while frames are being processed, see `tick`.
+                            Default is `None`, which never dumps on its own.
+            sink     str:   A file that every dump is appended to as one line
+                            of JSON, or '-' for a table on stdout. Default is
+                            `None`, which is stdout.
+        """
+
+        self.__interval = interval
+        self.__sink = sink
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets every sample and count."""
+
+        with self.__lock:
+            self.__started = clock()
+            self.__dumped = self.__started
+            self.__stages = {}
+            self.__counters = {
+                'frames': 0,
+                'empty': 0,
+                'cached': 0,
+                'undecodable': 0,
+                'dropped': 0
+            }
+            self.__circles = {}
+
+    def start(self):
+        """Marks the start of a stage.
+
+        Returns:
+            (float, float): The wall and CPU clocks, for `lap`. The CPU clock
+                            is `None` if it can't be measured.
+        """
+
+        return clock(), cpu_clock() if cpu_clock is not None else None
+
+    def lap(self, stage, start):
+        """Records the time since `start` against a stage.
+
+        Args:
+            stage str:            The name of the stage.
+            start (float, float): The output of `start` or of the previous
+                                  `lap`.
+
+        Returns:
+            (float, float): The wall and CPU clocks now, so that consecutive
+                            stages can be timed back to back.
+        """
+
+        now = self.start()
+        cpu = None if now[1] is None else now[1] - start[1]
+        self.record(stage, now[0] - start[0], cpu)
+        return now
+
+    def record(self, stage, wall, cpu):
+        """Records a single sample of a stage.
+
+        Args:
+            stage str:   The name of the stage.
+            wall  float: The wall time taken in seconds.
+            cpu   float: The CPU time taken in seconds by the thread that ran
+                         the stage, or `None` if it wasn't measured.
+        """
+
+        with self.__lock:
+            entry = self.__stages.get(stage)
+            if entry is None:
+                entry = [0, 0.0, 0.0, [0] * self.BUCKETS, [0] * self.BUCKETS]
+                self.__stages[stage] = entry
+            entry[0] += 1
+            entry[1] += wall
+            entry[3][self.__bucket(wall)] += 1
+            if cpu is not None:
+                entry[2] += cpu
+                entry[4][self.__bucket(cpu)] += 1
+
+    def frame(self, circles):
+        """Counts a processed frame.
+
+        Args:
+            circles int: The number of circles found in it.
+        """
+
+        with self.__lock:
+            self.__counters['frames'] += 1
+            if not circles:
+                self.__counters['empty'] += 1
+            self.__circles[circles] = self.__circles.get(circles, 0) + 1
+
+    def count(self, counter, n=1):
+        """Adds to a counter, such as 'cached' or 'undecodable' frames.
+
+        Args:
+            counter str: The name of the counter.
+            n       int: The amount to add, default is 1.
+        """
+
+        with self.__lock:
+            self.__counters[counter] = self.__counters.get(counter, 0) + n
+
+    def snapshot(self):
+        """Fetches everything recorded so far.
+
+        Returns:
+            dict: The seconds `elapsed`, every counter, a `circles` histogram
+                  of circles per frame, and the `stages`. Each stage holds its
+                  sample `count`, total `wall` and `cpu` seconds, their
+                  `wall_histogram` and `cpu_histogram` where bucket i counts
+                  samples shorter than 2^i microseconds, and wall time
+                  percentiles estimated from the histogram. The CPU fields
+                  are `None` where CPU time isn't measured.
+        """
+
+        with self.__lock:
+            snapshot = dict(self.__counters)
+            snapshot['elapsed'] = clock() - self.__started
+            snapshot['circles'] = dict(
+                (str(n), count) for n, count in self.__circles.items()
+            )
+            stages = {}
+            for stage, entry in self.__stages.items():
+                count, wall, cpu, walls, cpus = entry
+                measured = cpu_clock is not None
+                stages[stage] = {
+                    'count': count,
+                    'wall': wall,
+                    'cpu': cpu if measured else None,
+                    'wall_histogram': list(walls),
+                    'cpu_histogram': list(cpus) if measured else None,
+                    'p50_ms': self.__percentile(walls, count, 0.5),
+                    'p90_ms': self.__percentile(walls, count, 0.9),
+                    'p99_ms': self.__percentile(walls, count, 0.99)
+                }
+            snapshot['stages'] = stages
+        return snapshot
+
+    def merge(self, snapshot):
+        """Adds the samples and counts of another snapshot to these.
+
+        Used to gather the statistics of worker processes.
+
+        Args:
+            snapshot dict: The output of `snapshot`.
+        """
+
+        with self.__lock:
+            for counter, value in snapshot.items():
+                if counter in ('elapsed', 'circles', 'stages'):
+                    continue
+                self.__counters[counter] = (
+                    self.__counters.get(counter, 0) + value
+                )
+            for n, count in snapshot['circles'].items():
+                n = int(n)
+                self.__circles[n] = self.__circles.get(n, 0) + count
+            for stage, other in snapshot['stages'].items():
+                entry = self.__stages.get(stage)
+                if entry is None:
+                    entry = [
+                        0,
+                        0.0,
+                        0.0,
+                        [0] * self.BUCKETS,
+                        [0] * self.BUCKETS
+                    ]
+                    self.__stages[stage] = entry
+                entry[0] += other['count']
+                entry[1] += other['wall']
+                for i in range(self.BUCKETS):
+                    entry[3][i] += other['wall_histogram'][i]
+                if other['cpu'] is not None:
+                    entry[2] += other['cpu']
+                    for i in range(self.BUCKETS):
+                        entry[4][i] += other['cpu_histogram'][i]
+
+    def tick(self):
+        """Dumps the statistics if the interval has passed since the last."""
+
+        if self.__interval is None:
+            return
+        if clock() - self.__dumped >= self.__interval:
+            self.dump()
+
+    def dump(self):
+        """Writes the statistics to the sink."""
+
+        self.__dumped = clock()
+        snapshot = self.snapshot()
+        if self.__sink is None or self.__sink == '-':
+            sys.stdout.write(self.format(snapshot) + '\n')
+            sys.stdout.flush()
+            return
+        with open(self.__sink, 'a') as f:
+            f.write(json.dumps(snapshot, sort_keys=True) + '\n')
+
+    def format(self, snapshot=None):
+        """Lays the statistics out as a table.
+
+        Args:
+            snapshot dict: The output of `snapshot`. Default is `None`, which
+                           takes a new one.
+
+        Returns:
+            str: The table.
+        """
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+
+        circles = ', '.join(
+            '{}: {}'.format(n, snapshot['circles'][n])
+            for n in sorted(snapshot['circles'], key=int)
+        )
+        others = ', '.join(
+            '{}: {}'.format(counter, snapshot[counter])
+            for counter in sorted(snapshot)
+            if counter not in self.__STANDARD
+        )
+        lines = [
+            'Frames: {} in {:.1f} s, {} without a detection, {} cached,'
+            ' {} undecodable, {} dropped'.format(
+                snapshot['frames'],
+                snapshot['elapsed'],
+                snapshot['empty'],
+                snapshot['cached'],
+                snapshot['undecodable'],
+                snapshot['dropped']
+            ),
+            'Circles per frame: {}'.format(circles or '-'),
+            'Other counters: {}'.format(others or '-'),
+            '{:<10} {:>8} {:>10} {:>10} {:>9} {:>9} {:>9}'.format(
+                'stage',
+                'count',
+                'wall s',
+                'cpu s',
+                'p50 ms',
+                'p90 ms',
+                'p99 ms'
+            )
+        ]
+        for stage in sorted(snapshot['stages']):
+            entry = snapshot['stages'][stage]
+            lines.append(
+                '{:<10} {:>8} {:>10.3f} {:>10} {:>9.3f} {:>9.3f}'
+                ' {:>9.3f}'.format(
+                    stage,
+                    entry['count'],
+                    entry['wall'],
+                    '-' if entry['cpu'] is None else '{:.3f}'.format(
+                        entry['cpu']
+                    ),
+                    entry['p50_ms'],
+                    entry['p90_ms'],
+                    entry['p99_ms']
+                )
+            )
+        return '\n'.join(lines)
+
+    def __bucket(self, seconds):
+        if seconds <= 0.0:
+            return 0
+        # the exponent is the number of bits in the microseconds
+        return min(self.BUCKETS - 1, max(0, math.frexp(seconds * 1e6)[1]))
+
+    def __percentile(self, histogram, count, fraction):
+        # report the upper edge of the bucket the percentile falls into
+        if not count:
+            return 0.0
+        target = fraction * count
+        seen = 0
+        for i, n in enumerate(histogram):
+            seen += n
+            if seen >= target:
+                return (1 << i) / 1000.0
+        return (1 << (len(histogram) - 1)) / 1000.0
@@ -0,0 +1,259 @@
+"""Writes the results of a ball extractor to disk in the background."""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import csv
+import sys
+import threading
+import cv2
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+def output_paths(src, dst, name=None):
+    """Names the annotated image and mask written for a source image.
+
+    Args:
+        src  str: The path to the source image.
+        dst  str: The output directory.
+        name str: The path of the results relative to `dst`, such as the path
+                  of the source relative to the directory it was found in, so
+                  that images of the same name in different subdirectories
+                  don't overwrite each other. Default is `None`, which uses
+                  the base name of `src`.
+
+    Returns:
+        (str, str): The paths of the annotated image and of its mask.
+    """
+
+    if name is None:
+        name = os.path.basename(src)
+    name, ext = os.path.splitext(name)
+    return (
+        os.path.join(dst, name + ext),
+        os.path.join(dst, name + '-mask' + ext)
+    )
+
+def write_frame(options, src, raw, mask, name=None):
+    """Encodes and writes the images of a single frame.
+
+    Args:
+        options (str, [int], bool): The output directory, `cv2.imwrite`
+                                    parameters and whether masks are written,
+                                    as returned by `ResultWriter.options`.
+        src     str:                The path to the source image.
+        raw     numpy.ndarray:      The annotated image.
+        mask    numpy.ndarray:      The annotated mask.
+        name    str:                The path of the results relative to the
+                                    output directory, see `output_paths`.
+                                    Subdirectories are created as needed.
+                                    Default is `None`.
+    """
+
+    dst, params, masks = options
+    result, masked = output_paths(src, dst, name)
+    directory = os.path.dirname(result)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another writer may have just made it
+            if not os.path.isdir(directory):
+                raise
+    cv2.imwrite(result, raw, params)
+    if masks:
+        cv2.imwrite(masked, mask, params)
+
+class ResultWriter:
+    """Describes a writer that encodes images on a pool of threads.
+
+    Frames are queued up to `backlog` deep, so encoding and disk writes
+    overlap with detection without letting memory grow when the disk falls
+    behind. A summary file with one row per circle can be written alongside
+    the images, or in place of them.
+    """
+
+    def __init__(
+        self,
+        dst,
+        quality=95,
+        masks=True,
+        images=True,
+        summary=None,
+        threads=2,
+        backlog=8,
+        stats=None
+    ):
+        """Initializes a result writer.
+
+        Args:
+            dst     str:        The output directory, which must already
+                                exist.
+            quality int:        The JPEG quality from 0 to 100, default is
+                                95.
+            masks   bool:       Whether masks are written next to each
+                                result, default is `True`.
+            images  bool:       Whether annotated images are written at all,
+                                default is `True`.
+            summary str:        The name of a CSV file in `dst` that receives
+                                the (source, x, y, r) of every circle.
+                                Default is `None`, which writes no summary.
+            threads int:        The number of encoding threads. `0` writes on
+                                the calling thread. Default is 2.
+            backlog int:        The maximum number of frames waiting to be
+                                written, default is 8.
+            stats   StageStats: Receives the time taken to write each frame.
+                                Default is `None`.
+        """
+
+        self.__options = (dst, [cv2.IMWRITE_JPEG_QUALITY, quality], masks)
+        self.__images = images
+        self.__error = None
+        self.__closed = False
+        self.__stats = stats
+
+        self.__summary = None
+        self.__rows = None
+        if summary is not None:
+            # the csv module quotes paths holding commas or quotes, but wants
+            # bytes on Python 2 and untranslated newlines on Python 3
+            path = os.path.join(dst, summary)
+            if sys.version_info[0] < 3:
+                self.__summary = open(path, 'wb')
+            else:
+                self.__summary = open(path, 'w', newline='')
+            self.__rows = csv.writer(self.__summary, lineterminator='\n')
+            self.__rows.writerow(['source', 'x', 'y', 'r'])
+
+        self.__jobs = queue.Queue(maxsize=backlog)
+        self.__threads = []
+        if images:
+            for _ in range(threads):
+                thread = threading.Thread(target=self.__run)
+                thread.daemon = True
+                thread.start()
+                self.__threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def options(self):
+        """Accessor to the settings needed by `write_frame`.
+
+        Returns:
+            (str, [int], bool): The output directory, `cv2.imwrite` parameters
+                                and whether masks are written, or `None` if
+                                images are not being written.
+        """
+
+        return self.__options if self.__images else None
+
+    def write(self, src, circles, raw=None, mask=None, name=None):
+        """Records the results of a frame.
+
+        Blocks while the backlog is full.
+
+        Args:
+            src     str:           The path to the source image.
+            circles numpy.ndarray: An Nx3 array of the (x, y, r) circles found.
+            raw     numpy.ndarray: The annotated image. Default is `None`,
+                                   which skips writing images, e.g. when they
+                                   were already written by a worker process.
+            mask    numpy.ndarray: The annotated mask. It is copied, so its
+                                   buffer may be reused once this returns.
+                                   Default is `None`.
+            name    str:           The path of the results relative to the
+                                   output directory, see `output_paths`.
+                                   Default is `None`, which uses the base name
+                                   of `src`.
+        """
+
+        self.__raise()
+
+        if self.__summary is not None:
+            if not len(circles):
+                self.__rows.writerow([src, '', '', ''])
+            for x, y, r in circles:
+                self.__rows.writerow([
+                    src,
+                    '{:.2f}'.format(x),
+                    '{:.2f}'.format(y),
+                    '{:.2f}'.format(r)
+                ])
+
+        if not self.__images:
+            return
+
+        result, masked = output_paths(src, self.__options[0], name)
+        if raw is not None:
+            if self.__options[2]:
+                mask = mask.copy()
+            else:
+                mask = None
+
+            if self.__threads:
+                self.__jobs.put((src, raw, mask, name))
+            else:
+                self.__write(src, raw, mask, name)
+
+        print('Result: ' + result)
+        if self.__options[2]:
+            print('Mask  : ' + masked)
+
+    def flush(self):
+        """Waits until every queued frame has been written."""
+
+        self.__jobs.join()
+        if self.__summary is not None:
+            self.__summary.flush()
+        self.__raise()
+
+    def close(self):
+        """Flushes the writer and stops its threads."""
+
+        if self.__closed:
+            return
+        self.__closed = True
+
+        for _ in self.__threads:
+            self.__jobs.put(None)
+        for thread in self.__threads:
+            thread.join()
+        if self.__summary is not None:
+            self.__summary.close()
+        self.__raise()
+
+    def __run(self):
+        while True:
+            job = self.__jobs.get()
+            try:
+                if job is None:
+                    return
+                # once a write fails, drain the rest without writing
+                if self.__error is None:
+                    self.__write(*job)
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__jobs.task_done()
+
+    def __write(self, src, raw, mask, name):
+        if self.__stats is None:
+            write_frame(self.__options, src, raw, mask, name)
+            return
+        start = self.__stats.start()
+        write_frame(self.__options, src, raw, mask, name)
+        self.__stats.lap('write', start)
+
+    def __raise(self):
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
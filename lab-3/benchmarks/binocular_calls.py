@@ -0,0 +1,84 @@
+"""Compares the calls per second of each way to triangulate a centroid.
+
+Runs `Binocular.position`, `CompactBinocular.position` and
+`Binocular.position_batch` over the same random centroids, checks they agree
+and reports how many centroids each locates per second.
+
+Usage: python binocular_calls.py [COUNT] [ROUNDS]
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from binocular import Binocular
+
+def centroids(count):
+    rng = np.random.RandomState(0)
+    left = rng.uniform((100, 50), (650, 430), (count, 2))
+    right = left.copy()
+    right[:, 0] -= rng.uniform(5, 200, count)
+    return left, right
+
+def run(call, rounds):
+    best = float('inf')
+    result = None
+    for _ in range(rounds):
+        start = time.time()
+        result = call()
+        best = min(best, time.time() - start)
+    return result, best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    left, right = centroids(count)
+    pairs = [
+        (tuple(l), tuple(r)) for l, r in zip(left.tolist(), right.tolist())
+    ]
+    rows = [tuple(l + r) for l, r in zip(left.tolist(), right.tolist())]
+
+    binocular = Binocular()
+    compact = binocular.compact()
+
+    def position():
+        return [binocular.position(l, r)[0] for l, r in pairs]
+
+    def compact_position():
+        locate = compact.position
+        return [locate(*row) for row in rows]
+
+    def position_batch():
+        return binocular.position_batch(left, right)[0]
+
+    expected = None
+    print('{:<18} {:>14} {:>9}'.format('path', 'calls/s', 'speedup'))
+    for name, call in [
+        ('position', position),
+        ('compact', compact_position),
+        ('position_batch', position_batch)
+    ]:
+        result, elapsed = run(call, rounds)
+        result = np.asarray(result, dtype=np.float64)
+        if expected is None:
+            expected, baseline = result, elapsed
+        elif not np.allclose(result, expected):
+            print('\n*** Error: {} disagrees with position! ***'.format(name))
+            sys.exit(1)
+        print('{:<18} {:>14,.0f} {:>8.1f}x'.format(
+            name,
+            count / elapsed,
+            baseline / elapsed
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Measures the memory allocated by the masking stage of a ball extractor.
+
+Runs the original masking stage (blur, YCrCb, mask, masked copy, YCrCb to RGB
+to GRAY) and `Detector.mask` over the images in lab-3/images and reports the
+bytes allocated per frame by each. Allocations are also expressed in
+full-frame buffers, where 1.0 is one single channel 8-bit frame.
+
+The two stages don't search the same image: the original one detects circles
+in the unblurred frame after converting it as though it were YCrCb, and
+`Detector.mask` in the luma of the blurred frame it already converted. The
+circle found in each image by both is compared too, and the script exits with
+a non-zero status if a center or radius moved further than the tolerance.
+
+Measuring allocations requires Python 3.9 or newer for
+`tracemalloc.reset_peak`, unlike the rest of lab-3, which also runs on
+Python 2. Older interpreters only compare the detections, and `suite.py` skips
+the measurement on them.
+
+Usage: python mask_allocations.py [ROUNDS] [TOLERANCE]
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import sys
+import glob
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'ball_extractor'))
+
+from detector import Detector
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# peaks are reset between frames, which tracemalloc can only do from 3.9 on
+SUPPORTED = tracemalloc is not None and hasattr(tracemalloc, 'reset_peak')
+
+TOLERANCE = 5.0
+
+LOW = np.array([60, 0, 0])
+HIGH = np.array([255, 144, 129])
+
+def legacy_mask(raw):
+    blur = cv2.GaussianBlur(raw, (11, 11), 0)
+    ycrcb = cv2.cvtColor(blur, cv2.COLOR_BGR2YCrCb)
+    mask = cv2.inRange(ycrcb, LOW, HIGH)
+    masked = cv2.bitwise_and(raw, raw, mask=mask)
+    masked = cv2.cvtColor(masked, cv2.COLOR_YCrCb2RGB)
+    masked = cv2.cvtColor(masked, cv2.COLOR_RGB2GRAY)
+    return masked, mask
+
+def measure(mask, raws, rounds):
+    # warm up so one-off scratch buffers aren't counted against every frame
+    for raw in raws:
+        mask(raw)
+
+    allocated = 0
+    start = time.time()
+    for _ in range(rounds):
+        for raw in raws:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            outputs = mask(raw)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+            del outputs
+    elapsed = time.time() - start
+
+    frames = rounds * len(raws)
+    return allocated / frames, elapsed / frames
+
+def measure_all(raws, rounds):
+    """Measures the legacy and fused masking stages over a set of frames."""
+
+    tracemalloc.start()
+    try:
+        detector = Detector()
+        return [
+            ('legacy', measure(legacy_mask, raws, rounds)),
+            ('fused', measure(detector.mask, raws, rounds))
+        ]
+    finally:
+        tracemalloc.stop()
+
+def compare_detections(raws):
+    """Finds the strongest circle in each frame with both masking stages.
+
+    Returns:
+        [(numpy.ndarray, numpy.ndarray)]: The legacy and fused (x, y, r) of
+                                          each frame, or `None` where a stage
+                                          found nothing.
+    """
+
+    detector = Detector()
+    found = []
+    for raw in raws:
+        legacy = detector.detect(legacy_mask(raw)[0])
+        fused = detector.detect(detector.mask(raw)[0].copy())
+        found.append(tuple(
+            circles[0] if len(circles) else None
+            for circles in (legacy, fused)
+        ))
+    return found
+
+def report_detections(names, found):
+    """Prints how far each detection moved, returning the largest move."""
+
+    print('{:<12} {:>20} {:>20} {:>8} {:>8}'.format(
+        'image',
+        'legacy x, y, r',
+        'fused x, y, r',
+        'shift',
+        'radius'
+    ))
+    worst = 0.0
+    for name, (legacy, fused) in zip(names, found):
+        if legacy is None or fused is None:
+            print('{:<12} {:>20} {:>20} {:>8} {:>8}'.format(
+                name,
+                '-' if legacy is None else '{:.1f}, {:.1f}, {:.1f}'.format(
+                    *legacy
+                ),
+                '-' if fused is None else '{:.1f}, {:.1f}, {:.1f}'.format(
+                    *fused
+                ),
+                'lost',
+                'lost'
+            ))
+            worst = float('inf')
+            continue
+        shift = float(np.hypot(*(fused[:2] - legacy[:2])))
+        radius = float(fused[2] - legacy[2])
+        worst = max(worst, shift, abs(radius))
+        print('{:<12} {:>20} {:>20} {:>8.2f} {:>+8.2f}'.format(
+            name,
+            '{:.1f}, {:.1f}, {:.1f}'.format(*legacy),
+            '{:.1f}, {:.1f}, {:.1f}'.format(*fused),
+            shift,
+            radius
+        ))
+    return worst
+
+def report(results, pixels):
+    """Prints the results as a table."""
+
+    print('{:<8} {:>14} {:>14} {:>10}'.format(
+        'stage',
+        'bytes/frame',
+        'frame buffers',
+        'ms/frame'
+    ))
+    for name, (allocated, seconds) in results:
+        print('{:<8} {:>14.0f} {:>14.2f} {:>10.3f}'.format(
+            name,
+            allocated,
+            float(allocated) / pixels,
+            seconds * 1000
+        ))
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else TOLERANCE
+    paths = sorted(glob.glob(os.path.join(HERE, '..', 'images', '*.jpg')))
+    raws = [cv2.imread(p) for p in paths]
+    pixels = raws[0].shape[0] * raws[0].shape[1]
+
+    if SUPPORTED:
+        report(measure_all(raws, rounds), pixels)
+    else:
+        print('Skipping allocations, which need Python 3.9 or newer')
+
+    print('')
+    worst = report_detections(
+        [os.path.basename(path) for path in paths],
+        compare_detections(raws)
+    )
+    if worst > tolerance:
+        err = '\n*** Error: Exceeded tolerance of {} px! ***'
+        print(err.format(tolerance))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Compares reduced-resolution detection against full resolution detection.
+
+Runs `Detector.process` over the images in lab-3/images at full resolution and
+at each pyramid scale, then reports frames per second and the largest
+difference in center and radius from the full resolution result. Exits with a
+non-zero status if any scale strays further than the tolerance.
+
+Usage: python pyramid.py [TOLERANCE] [ROUNDS]
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import sys
+import glob
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'ball_extractor'))
+
+from detector import Detector
+
+SCALES = [1, 2, 4]
+
+def run(detector, raws, scale, rounds):
+    results = []
+    start = time.time()
+    for _ in range(rounds):
+        results = [
+            detector.process(raw.copy(), scale=scale)[0] for raw in raws
+        ]
+    elapsed = time.time() - start
+    return results, rounds * len(raws) / elapsed
+
+def deviation(expected, actual):
+    worst = 0.0
+    for want, got in zip(expected, actual):
+        if len(want) != len(got):
+            return float('inf')
+        if len(want):
+            worst = max(worst, float(np.abs(want[0] - got[0]).max()))
+    return worst
+
+def main():
+    tolerance = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    paths = sorted(glob.glob(os.path.join(HERE, '..', 'images', '*.jpg')))
+    raws = [cv2.imread(p) for p in paths]
+    detector = Detector()
+
+    baseline = None
+    failed = False
+    print('{:<6} {:>10} {:>12}'.format('scale', 'frames/s', 'max error'))
+    for scale in SCALES:
+        results, fps = run(detector, raws, scale, rounds)
+        if baseline is None:
+            baseline = results
+        error = deviation(baseline, results)
+        failed = failed or error > tolerance
+        print('{:<6} {:>10.1f} {:>12.2f}'.format(scale, fps, error))
+
+    if failed:
+        err = '\n*** Error: Exceeded tolerance of {} px! ***'
+        print(err.format(tolerance))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
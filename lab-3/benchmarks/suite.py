@@ -0,0 +1,569 @@
+"""Measures every hot path of ball extraction and triangulation.
+
+Runs each stage of a ball extractor (decode, mask and its blur, convert and
+threshold steps, detect, refine, draw and write), path gathering and a whole
+`BallExtractor.extract` over the images in lab-3/images and over generated
+frames of several sizes, then times `Binocular.position` and its faster
+variants over random centroids. Reports latency percentiles, frames per
+second and peak memory per stage, and can write them as JSON and compare them
+against an earlier run, exiting with a non-zero status when a stage got slower
+than the tolerance allows.
+
+Peak memory is measured with `tracemalloc` and is only available on Python 3.
+The allocations of the masking stage, see `mask_allocations.py`, are reported
+after the timings on Python 3.9 or newer and skipped elsewhere.
+
+Usage: python suite.py [options]
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import sys
+import glob
+import json
+import time
+import getopt
+import shutil
+import platform
+import tempfile
+
+import cv2
+import numpy as np
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'ball_extractor'))
+
+from binocular import Binocular
+from detector import Detector
+from extractor import BallExtractor
+from path import PathAccumulator
+from writer import write_frame
+
+import mask_allocations
+
+clock = getattr(time, 'perf_counter', time.time)
+
+SIZES = [(376, 240), (752, 480), (1504, 960)]
+COUNT = 20
+ROUNDS = 3
+CENTROIDS = 2000
+TOLERANCE = 0.2
+
+# the (x, y, r) of the ball in left1.jpg
+BALL = (568, 191, 49)
+
+def synthesize(size, count):
+    """Generates frames of the ball from left1.jpg flying across its scene.
+
+    The ball is painted out of the photo and pasted back along an arc at its
+    own size, with the scene cropped, or padded with its mean color, to
+    `size` rather than scaled. Every size then holds exactly the ball that
+    the detector is tuned for and no more, so only the pixels to search grow.
+    """
+
+    source = cv2.imread(os.path.join(HERE, '..', 'images', 'left1.jpg'))
+    x, y, r = BALL
+    hole = np.zeros(source.shape[:2], np.uint8)
+    cv2.circle(hole, (x, y), r + 8, 255, -1)
+    scene = cv2.inpaint(source, hole, 5, cv2.INPAINT_TELEA)
+
+    reach = r + 12
+    ball = source[y - reach:y + reach, x - reach:x + reach]
+    outline = np.zeros(ball.shape[:2], np.uint8)
+    cv2.circle(outline, (reach, reach), r + 2, 255, -1)
+    outline = outline > 0
+    side = ball.shape[0]
+
+    width, height = size
+    if min(width, height) < side:
+        raise ValueError(
+            'Frames must be at least {0}x{0} to hold the ball'.format(side)
+        )
+    scene = cv2.copyMakeBorder(
+        scene,
+        0,
+        max(0, height - scene.shape[0]),
+        0,
+        max(0, width - scene.shape[1]),
+        cv2.BORDER_CONSTANT,
+        value=cv2.mean(scene)
+    )
+    top = (scene.shape[0] - height) // 2
+    left = (scene.shape[1] - width) // 2
+    scene = scene[top:top + height, left:left + width]
+
+    frames = []
+    for i in range(count):
+        frame = scene.copy()
+        t = float(i) / max(1, count - 1)
+        x0 = int(t * (width - side))
+        # a shallow arc keeps clear of the table, whose white edges would
+        # otherwise add a circle as the ball passes
+        y0 = int((height - side) * (0.1 + 0.8 * (t - 0.5) ** 2))
+        frame[y0:y0 + side, x0:x0 + side][outline] = ball[outline]
+        frames.append(frame)
+    return frames
+
+def verify(paths):
+    """Lists the generated frames the detector finds other than one ball in.
+
+    Every stage after detection only has work to do when the ball is found,
+    so timings of frames without it, or with extra circles, would mislead.
+    """
+
+    detector = Detector()
+    wrong = []
+    for path in paths:
+        circles, _ = detector.process(detector.load(path))
+        if len(circles) != 1:
+            wrong.append((path, len(circles)))
+    return wrong
+
+class Laps:
+    """Keeps every lap of an instrumented detector as a sample of its stage.
+
+    Stands in for `StageStats`, whose histograms are too coarse to compare
+    runs by.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    def start(self):
+        return clock()
+
+    def lap(self, stage, start):
+        now = clock()
+        self.samples.setdefault(stage, []).append(now - start)
+        return now
+
+def summarize(dataset, stage, samples, frames, peak):
+    """Reduces raw timings to the figures that are reported."""
+
+    samples = np.asarray(samples, dtype=np.float64)
+    total = samples.sum()
+    return {
+        'dataset': dataset,
+        'stage': stage,
+        'samples': int(len(samples)),
+        'p50_ms': float(np.percentile(samples, 50)) * 1000,
+        'p90_ms': float(np.percentile(samples, 90)) * 1000,
+        'p99_ms': float(np.percentile(samples, 99)) * 1000,
+        'mean_ms': float(samples.mean()) * 1000,
+        'fps': frames / total if total > 0 else None,
+        'peak_bytes': peak
+    }
+
+def peak_memory(call):
+    """Finds the most memory a call holds at once, if it can be traced."""
+
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def time_stage(dataset, stage, calls, rounds, frames_per_call=1):
+    """Times a list of calls, each of which is one sample per round."""
+
+    samples = []
+    for _ in range(rounds):
+        for call in calls:
+            start = clock()
+            call()
+            samples.append(clock() - start)
+
+    peak = 0
+    for call in calls[:3]:
+        traced = peak_memory(call)
+        peak = None if traced is None else max(peak, traced)
+    return summarize(
+        dataset,
+        stage,
+        samples,
+        len(samples) * frames_per_call,
+        peak
+    )
+
+def bench_frames(dataset, paths, rounds, scratch):
+    """Times every stage of a ball extractor over a set of images on disk."""
+
+    detector = Detector()
+    raws = [cv2.imread(path) for path in paths]
+    results = []
+
+    results.append(time_stage(
+        dataset,
+        'decode',
+        [lambda p=p: detector.load(p) for p in paths],
+        rounds
+    ))
+    results.append(time_stage(
+        dataset,
+        'mask',
+        [lambda raw=raw: detector.mask(raw) for raw in raws],
+        rounds
+    ))
+
+    # the steps of the mask, timed by the detector itself so that they run
+    # on the same scratch buffers
+    laps = Laps()
+    detector.instrument(laps)
+    try:
+        for _ in range(rounds):
+            for raw in raws:
+                detector.mask(raw)
+    finally:
+        detector.instrument(None)
+    for step in ('blur', 'convert', 'threshold'):
+        samples = laps.samples[step]
+        results.append(summarize(
+            dataset,
+            'mask_' + step,
+            samples,
+            len(samples),
+            None
+        ))
+
+    masks = []
+    for raw in raws:
+        masked, mask = detector.mask(raw)
+        masks.append((masked.copy(), mask.copy()))
+    results.append(time_stage(
+        dataset,
+        'detect',
+        [lambda m=m: detector.detect(m) for m, _ in masks],
+        rounds
+    ))
+
+    circles = [detector.detect(masked) for masked, _ in masks]
+    results.append(time_stage(
+        dataset,
+        'refine',
+        [
+            lambda c=c, m=m: detector.refine(c, m)
+            for c, (_, m) in zip(circles, masks)
+        ],
+        rounds
+    ))
+
+    canvases = [raw.copy() for raw in raws]
+    results.append(time_stage(
+        dataset,
+        'draw',
+        [
+            lambda c=c, img=img: detector.draw(c, img)
+            for c, img in zip(circles, canvases)
+        ],
+        rounds
+    ))
+
+    out = os.path.join(scratch, 'write')
+    os.makedirs(out)
+    options = (out, [cv2.IMWRITE_JPEG_QUALITY, 95], True)
+    results.append(time_stage(
+        dataset,
+        'write',
+        [
+            lambda p=p, raw=raw, m=m: write_frame(options, p, raw, m)
+            for p, raw, (_, m) in zip(paths, canvases, masks)
+        ],
+        rounds
+    ))
+
+    results.append(time_stage(
+        dataset,
+        'process',
+        [lambda raw=raw: detector.process(raw.copy()) for raw in raws],
+        rounds
+    ))
+
+    directory = os.path.dirname(paths[0])
+    results.append(time_stage(
+        dataset,
+        'path_walk',
+        [lambda: PathAccumulator(['.jpg', '.jpeg']).path_walk([directory])],
+        rounds * 5,
+        len(paths)
+    ))
+
+    extractor = BallExtractor()
+
+    def extract():
+        # results are announced on stdout, which would swamp the report
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            extractor.extract([directory], os.path.join(scratch, 'extract'))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    results.append(time_stage(
+        dataset,
+        'extract',
+        [extract],
+        rounds,
+        len(paths)
+    ))
+    return results
+
+def bench_binocular(count, rounds):
+    """Times every way of triangulating a centroid."""
+
+    rng = np.random.RandomState(0)
+    left = rng.uniform((100, 50), (650, 430), (count, 2))
+    right = left.copy()
+    right[:, 0] -= rng.uniform(5, 200, count)
+    pairs = [
+        (tuple(l), tuple(r)) for l, r in zip(left.tolist(), right.tolist())
+    ]
+    rows = [tuple(l + r) for l, r in zip(left.tolist(), right.tolist())]
+
+    binocular = Binocular()
+    compact = binocular.compact()
+    return [
+        time_stage(
+            'centroids',
+            'position',
+            [lambda l=l, r=r: binocular.position(l, r) for l, r in pairs],
+            rounds
+        ),
+        time_stage(
+            'centroids',
+            'compact_position',
+            [lambda row=row: compact.position(*row) for row in rows],
+            rounds
+        ),
+        time_stage(
+            'centroids',
+            'position_batch',
+            [lambda: binocular.position_batch(left, right)],
+            rounds,
+            count
+        )
+    ]
+
+def compare(results, baseline, tolerance):
+    """Lists the stages whose median latency grew beyond the tolerance."""
+
+    before = {}
+    for result in baseline.get('results', []):
+        before[(result['dataset'], result['stage'])] = result
+
+    regressions = []
+    for result in results:
+        old = before.get((result['dataset'], result['stage']))
+        if old is None or not old['p50_ms']:
+            continue
+        change = result['p50_ms'] / old['p50_ms'] - 1
+        if change > tolerance:
+            regressions.append((result, old, change))
+    return regressions
+
+def report(results):
+    """Prints the results as a table."""
+
+    print('{:<18} {:<17} {:>9} {:>9} {:>9} {:>11} {:>10}'.format(
+        'dataset',
+        'stage',
+        'p50 ms',
+        'p90 ms',
+        'p99 ms',
+        'frames/s',
+        'peak KiB'
+    ))
+    for result in results:
+        peak = result['peak_bytes']
+        print('{:<18} {:<17} {:>9.3f} {:>9.3f} {:>9.3f} {:>11.1f} '
+              '{:>10}'.format(
+                  result['dataset'],
+                  result['stage'],
+                  result['p50_ms'],
+                  result['p90_ms'],
+                  result['p99_ms'],
+                  result['fps'] or 0.0,
+                  '-' if peak is None else '{:.1f}'.format(peak / 1024.0)
+              ))
+
+def usage():
+    return ('Usage: python suite.py [options]'
+            '\n'
+            '\n    options: -s, --sizes     WxH,...  Sizes of the generated'
+            '\n                                      frames. Default is'
+            '\n                                      376x240,752x480,1504x960.'
+            '\n'
+            '\n             -n, --count     COUNT    Number of generated'
+            '\n                                      frames per size. Default'
+            '\n                                      is 20.'
+            '\n'
+            '\n             -r, --rounds    COUNT    Number of times every'
+            '\n                                      stage is repeated.'
+            '\n                                      Default is 3.'
+            '\n'
+            '\n             -j, --json      FILE     Write the results as'
+            '\n                                      JSON.'
+            '\n'
+            '\n             -c, --compare   FILE     Compare against the JSON'
+            '\n                                      of an earlier run.'
+            '\n'
+            '\n             -t, --tolerance FRACTION Largest accepted growth'
+            '\n                                      of a median latency.'
+            '\n                                      Default is 0.2.'
+            '\n'
+            '\n             -h, --help               Show this help message'
+            '\n                                      and exit.')
+
+def main():
+    try:
+        opts, args = getopt.getopt(
+            sys.argv[1:],
+            'hs:n:r:j:c:t:',
+            [
+                'help',
+                'sizes=',
+                'count=',
+                'rounds=',
+                'json=',
+                'compare=',
+                'tolerance='
+            ]
+        )
+        options = dict(opts)
+        sizes = SIZES
+        values = options.get('-s', options.get('--sizes'))
+        if values is not None:
+            sizes = [
+                tuple(int(v) for v in size.lower().split('x'))
+                for size in values.split(',')
+            ]
+        count = int(options.get('-n', options.get('--count', COUNT)))
+        rounds = int(options.get('-r', options.get('--rounds', ROUNDS)))
+        output = options.get('-j', options.get('--json'))
+        baseline = options.get('-c', options.get('--compare'))
+        tolerance = float(
+            options.get('-t', options.get('--tolerance', TOLERANCE))
+        )
+        if any(len(size) != 2 for size in sizes) or count < 1 or rounds < 1:
+            raise ValueError('Sizes, counts and rounds must be positive')
+    except (getopt.GetoptError, ValueError) as e:
+        print('\n*** Error: {} ***\n\n{}\n'.format(e, usage()))
+        sys.exit(2)
+
+    if '-h' in options or '--help' in options or args:
+        print('\n{}\n'.format(usage()))
+        return
+
+    cv2.setRNGSeed(0)
+    results = []
+    scratch = tempfile.mkdtemp()
+    try:
+        images = os.path.join(HERE, '..', 'images')
+        paths = sorted(glob.glob(os.path.join(images, '*.jpg')))
+        results += bench_frames(
+            'images',
+            paths,
+            rounds,
+            os.path.join(scratch, 'images')
+        )
+
+        for size in sizes:
+            dataset = 'synthetic-{}x{}'.format(*size)
+            directory = os.path.join(scratch, dataset, 'frames')
+            os.makedirs(directory)
+            paths = []
+            try:
+                frames = synthesize(size, count)
+            except ValueError as e:
+                print('\n*** Error: {} ***\n'.format(e))
+                sys.exit(2)
+            for i, frame in enumerate(frames):
+                path = os.path.join(directory, 'frame{:04d}.jpg'.format(i))
+                cv2.imwrite(path, frame)
+                paths.append(path)
+            wrong = verify(paths)
+            if wrong:
+                print('\n*** Error: {} of the {} frames hold {} circles'
+                      ' instead of 1 ***\n'.format(
+                          len(wrong),
+                          dataset,
+                          ', '.join(str(n) for _, n in wrong)
+                      ))
+                sys.exit(1)
+            results += bench_frames(
+                dataset,
+                paths,
+                rounds,
+                os.path.join(scratch, dataset)
+            )
+    finally:
+        shutil.rmtree(scratch)
+
+    results += bench_binocular(CENTROIDS, rounds)
+    report(results)
+
+    allocations = None
+    if mask_allocations.SUPPORTED:
+        images = os.path.join(HERE, '..', 'images')
+        raws = [
+            cv2.imread(path)
+            for path in sorted(glob.glob(os.path.join(images, '*.jpg')))
+        ]
+        allocations = mask_allocations.measure_all(raws, rounds)
+        print('')
+        mask_allocations.report(
+            allocations,
+            raws[0].shape[0] * raws[0].shape[1]
+        )
+    else:
+        print('\nSkipping mask allocations, which need Python 3.9 or newer')
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump({
+                'version': 1,
+                'created': time.time(),
+                'python': platform.python_version(),
+                'opencv': cv2.__version__,
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'rounds': rounds,
+                'results': results,
+                'allocations': None if allocations is None else [
+                    {
+                        'stage': name,
+                        'bytes_per_frame': allocated,
+                        'ms_per_frame': seconds * 1000
+                    }
+                    for name, (allocated, seconds) in allocations
+                ]
+            }, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        for result, old, change in regressions:
+            print('*** Regression: {} {} p50 {:.3f} ms -> {:.3f} ms'
+                  ' (+{:.0%}) ***'.format(
+                      result['dataset'],
+                      result['stage'],
+                      old['p50_ms'],
+                      result['p50_ms'],
+                      change
+                  ))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,16 @@ __version__ = '1.0.0'
 __author__ = 'Mike Nystoriak'
 __credits__ = ['Mike Nystoriak']
 
+import numpy as np
+
 class Binocular:
     """Determines the location of objects in 3D space using binocular math."""
 
+    PAIR_DTYPE = np.dtype([
+        ('left', np.float64, (2,)),
+        ('right', np.float64, (2,))
+    ])
+
     def __init__(
         self,
         baseline=60,
@@ -20,7 +27,8 @@ class Binocular:
         fov_width=752,
         fov_height=480,
         left_center=(376, 240),
-        right_center=(376, 240)
+        right_center=(376, 240),
+        calibration=None
     ):
         """Initializes a set of binoculars.
 
@@ -41,8 +49,21 @@ class Binocular:
             right_center (int|float, int|float): The coordinates of the center
                                                  point of the right camera in
                                                  pixels, default is (376, 240).
+            calibration  StereoCalibration:      A calibrated camera model.
+                                                 Centroids are undistorted and
+                                                 rectified through it, and it
+                                                 replaces every parameter but
+                                                 `pixel_size`. Default is
+                                                 `None`, which assumes ideal
+                                                 pinhole cameras.
         """
 
+        if calibration is not None:
+            baseline = calibration.baseline()
+            focal_length = calibration.focal_length() * float(pixel_size)
+            fov_width, fov_height = calibration.size()
+            left_center, right_center = calibration.centers()
+
         parameters, err = self.__sanitize_floats(
             baseline,
             focal_length,
@@ -63,6 +84,27 @@ class Binocular:
         self.__fov_height = parameters[4]
         self.__left_center = parameters[5]
         self.__right_center = parameters[6]
+        self.__calibration = calibration
+
+        # constant across calls, so fold them once
+        self.__depth_scale = self.__baseline * self.__focal_length
+        self.__pixel_scale = self.__pixel_size / self.__focal_length
+
+    def compact(self):
+        """Creates a compact copy of these binoculars for hot loops.
+
+        Returns:
+            CompactBinocular: Binoculars with the same parameters.
+        """
+
+        return CompactBinocular(
+            self.__baseline,
+            self.__focal_length,
+            self.__pixel_size,
+            self.__left_center,
+            self.__right_center,
+            self.__calibration
+        )
 
     def position(self, left, right):
         """Finds the location of a centroid in 3D spaces given two perspectives.
@@ -92,6 +134,15 @@ class Binocular:
         if err:
             return (None, None, None, None), err
 
+        if self.__calibration is not None:
+            lx, ly, rx, ry = self.__calibration.rectify_point(
+                left[0],
+                left[1],
+                right[0],
+                right[1]
+            )
+            left, right = (lx, ly), (rx, ry)
+
         if left == right:
             return (
                 None,
@@ -100,12 +151,134 @@ class Binocular:
                 None
             ), '*** Error: Equivalent centroids cause division by zero! ***'
 
+        return self.__locate(left, right), None
+
+    def position_batch(self, left, right=None):
+        """Finds the location of many centroids in 3D space at once.
+
+        Args:
+            left  numpy.ndarray: An Nx2 array of (x, y) centroids from the
+                                 perspective of the left camera, or a
+                                 structured array of `PAIR_DTYPE` holding both
+                                 perspectives.
+            right numpy.ndarray: An Nx2 array of (x, y) centroids from the
+                                 perspective of the right camera. Default is
+                                 `None`, which requires `left` to be a
+                                 structured array.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): An Nx4 array of the X, Y, and Z
+                                            coordinates and the disparity of
+                                            each centroid in millimeters,
+                                            and a boolean mask that is `False`
+                                            for rows with zero disparity.
+                                            Their coordinates are NaN.
+        """
+
+        if right is None:
+            pairs = np.asarray(left)
+            if pairs.dtype.names is None:
+                raise ValueError('*** Error: Expected a structured array of'
+                                 ' left and right centroids! ***')
+            left, right = pairs['left'], pairs['right']
+
+        try:
+            left = np.asarray(left, dtype=np.float64).reshape(-1, 2)
+            right = np.asarray(right, dtype=np.float64).reshape(-1, 2)
+        except (TypeError, ValueError):
+            raise ValueError('*** Error: All entries must be numbers! ***')
+
+        if len(left) != len(right):
+            raise ValueError('*** Error: Expected as many left centroids as'
+                             ' right centroids! ***')
+
+        if self.__calibration is not None:
+            left = self.__calibration.rectify(left, 'left')
+            right = self.__calibration.rectify(right, 'right')
+
+        positions = np.empty((len(left), 4))
+        x_offset = left[:, 0] - self.__left_center[0]
+        y_offset = left[:, 1] - self.__left_center[1]
+        disparity = positions[:, 3]
+        np.subtract(x_offset, right[:, 0] - self.__right_center[0], disparity)
+        np.abs(disparity, disparity)
+        disparity *= self.__pixel_size
+
+        valid = disparity > 0.0
+        z = positions[:, 2]
+        z.fill(np.nan)
+        np.divide(self.__depth_scale, disparity, out=z, where=valid)
+
+        np.multiply(z, x_offset * self.__pixel_scale, positions[:, 0])
+        np.multiply(z, y_offset * self.__pixel_scale, positions[:, 1])
+        return positions, valid
+
+    def project(self, x, y, z):
+        """Finds where a point in 3D space appears to each camera.
+
+        The inverse of `position`, for a right camera that sees points shifted
+        to the left. With a calibration, the coordinates are in the rectified
+        images, which are close to but not exactly the raw ones.
+
+        Args:
+            x float: The X coordinate in millimeters.
+            y float: The Y coordinate in millimeters.
+            z float: The Z coordinate in millimeters, which must be positive.
+
+        Returns:
+            ((float, float), (float, float)): The (x, y) pixel coordinates of
+                                              the point from the perspective
+                                              of the left and right cameras.
+        """
+
+        if z <= 0.0:
+            raise ValueError('*** Error: Points must be in front of the'
+                             ' cameras! ***')
+
+        scale = 1.0 / (z * self.__pixel_scale)
+        x_offset = x * scale
+        y_offset = y * scale
+        disparity = self.__depth_scale / z / self.__pixel_size
+        ly = self.__left_center[1] + y_offset
         return (
-            self.__x_position(left, right),
-            self.__y_position(left, right),
-            self.__z_position(left, right),
-            self.__disparity(left, right)
-        ), None
+            (self.__left_center[0] + x_offset, ly),
+            (self.__right_center[0] + x_offset - disparity, ly)
+        )
+
+    def depth(self, disparity, out=None):
+        """Converts a map of pixel disparities into depth.
+
+        Args:
+            disparity numpy.ndarray: The horizontal offset of each left pixel
+                                     to its match in the right image in
+                                     pixels, such as the output of block
+                                     matching on a rectified pair.
+            out       numpy.ndarray: A float32 array of the same shape to write
+                                     into. Default is `None`, which allocates
+                                     one.
+
+        Returns:
+            numpy.ndarray: The Z coordinate of each pixel in millimeters as
+                           float32, NaN where the disparity is not positive.
+        """
+
+        disparity = np.asarray(disparity)
+        if out is None:
+            out = np.empty(disparity.shape, np.float32)
+
+        # disparity is measured between the centers, as in `position`
+        np.subtract(
+            disparity,
+            self.__left_center[0] - self.__right_center[0],
+            out=out,
+            casting='unsafe'
+        )
+        out *= self.__pixel_size
+        with np.errstate(invalid='ignore'):
+            valid = out > 0.0
+        np.divide(self.__depth_scale, out, out=out, where=valid)
+        out[~valid] = np.nan
+        return out
 
     def prompt(self):
         """Runs a small command line interface."""
@@ -171,29 +344,108 @@ class Binocular:
                 '*** Error: All entries must be numbers! ***'
             )
 
-    def __disparity(self, left, right):
-        return abs(
-            (left[0] - self.__left_center[0]) -
-            (right[0] - self.__right_center[0])
+    def __locate(self, left, right):
+        x_offset = left[0] - self.__left_center[0]
+        d = abs(
+            x_offset - (right[0] - self.__right_center[0])
         ) * self.__pixel_size
+        z = self.__depth_scale / d if d > 0.0 else float('inf')
+        return (
+            z * x_offset * self.__pixel_scale,
+            z * (left[1] - self.__left_center[1]) * self.__pixel_scale,
+            z,
+            d
+        )
+
+class CompactBinocular(object):
+    """Determines the location of objects in 3D space without any checks.
+
+    Holds only the constants `position` needs in slots and skips the
+    sanitization done by `Binocular`, so it is meant for hot loops over
+    centroids that are already numbers, such as detector output.
+    """
+
+    __slots__ = (
+        '__calibration',
+        '__left_x',
+        '__left_y',
+        '__right_x',
+        '__pixel_size',
+        '__depth_scale',
+        '__pixel_scale'
+    )
+
+    def __init__(
+        self,
+        baseline=60,
+        focal_length=6,
+        pixel_size=0.006,
+        left_center=(376, 240),
+        right_center=(376, 240),
+        calibration=None
+    ):
+        """Initializes a set of compact binoculars.
+
+        Args:
+            baseline     int|float:              The baseline of the camera in
+                                                 millimeters, default is 60.
+            focal_length int|float:              The focal length in
+                                                 millimeters, default is 6.
+            pixel_size   int|float:              The size of a single pixel in
+                                                 millimeters, default is 0.006.
+            left_center  (int|float, int|float): The coordinates of the center
+                                                 point of the left camera in
+                                                 pixels, default is (376, 240).
+            right_center (int|float, int|float): The coordinates of the center
+                                                 point of the right camera in
+                                                 pixels, default is (376, 240).
+            calibration  StereoCalibration:      A calibrated camera model
+                                                 centroids are rectified
+                                                 through. It does not replace
+                                                 the other parameters, see
+                                                 `Binocular.compact`. Default
+                                                 is `None`.
+        """
+
+        self.__calibration = calibration
+        self.__left_x = float(left_center[0])
+        self.__left_y = float(left_center[1])
+        self.__right_x = float(right_center[0])
+        self.__pixel_size = float(pixel_size)
+        self.__depth_scale = float(baseline) * focal_length
+        self.__pixel_scale = float(pixel_size) / focal_length
+
+    def position(self, lx, ly, rx, ry):
+        """Finds the location of a centroid in 3D space given two perspectives.
+
+        Args:
+            lx float: The x coordinate of the centroid from the left camera.
+            ly float: The y coordinate of the centroid from the left camera.
+            rx float: The x coordinate of the centroid from the right camera.
+            ry float: The y coordinate of the centroid from the right camera.
+                      Only used when calibrated, but always accepted so rows
+                      unpack straight in.
+
+        Returns:
+            (float, float, float, float): The X, Y, and Z coordinate of the
+                                          centroid along with the disparity,
+                                          all in millimeters, or `None` if
+                                          the disparity is zero.
+        """
 
-    def __x_position(self, left, right):
-        return self.__z_position(left, right) * \
-               (left[0] - self.__left_center[0]) * \
-               self.__pixel_size / \
-               self.__focal_length
-
-    def __y_position(self, left, right):
-        return self.__z_position(left, right) * \
-               (left[1] - self.__left_center[1]) * \
-               self.__pixel_size / \
-               self.__focal_length
-
-    def __z_position(self, left, right):
-        d = self.__disparity(left, right)
-        if d <= 0.0:
-            return float('inf')
-        return self.__baseline * self.__focal_length / d
+        if self.__calibration is not None:
+            lx, ly, rx, ry = self.__calibration.rectify_point(lx, ly, rx, ry)
+
+        x_offset = lx - self.__left_x
+        d = x_offset - (rx - self.__right_x)
+        if d < 0.0:
+            d = -d
+        if d == 0.0:
+            return None
+        d *= self.__pixel_size
+        z = self.__depth_scale / d
+        scale = z * self.__pixel_scale
+        return x_offset * scale, (ly - self.__left_y) * scale, z, d
 
 def main():
     binoculars = Binocular()
@@ -0,0 +1,392 @@
+"""Describes a calibrated stereo camera pair and rectifies what it sees.
+
+Holds the intrinsics and distortion of each camera along with the rotation and
+translation between them. The lookup tables that undistort and rectify every
+pixel are solved once, cached to disk, and reused so that correcting a detected
+centroid is a bilinear table lookup rather than an iterative solve.
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import hashlib
+import cv2
+import numpy as np
+
+def load(path, cache=None):
+    """Loads a stereo calibration written by OpenCV.
+
+    The file is read with `cv2.FileStorage` and must hold the left and right
+    camera matrices and distortion coefficients as M1, D1, M2 and D2 and the
+    stereo rotation and translation as R and T, as written by OpenCV's stereo
+    calibration sample. An optional `size` node holds the (width, height) of
+    the images.
+
+    Args:
+        path  str: The path to a YAML or XML calibration file.
+        cache str: The directory lookup tables are cached in, see
+                   `StereoCalibration`. Default is `None`.
+
+    Returns:
+        StereoCalibration: The calibration.
+    """
+
+    storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    if not storage.isOpened():
+        raise ValueError(
+            '*** Error: Could not read calibration {}! ***'.format(path)
+        )
+
+    try:
+        nodes = []
+        for key in ['M1', 'D1', 'M2', 'D2', 'R', 'T']:
+            node = storage.getNode(key)
+            if node.empty():
+                raise ValueError(
+                    '*** Error: Calibration is missing {}! ***'.format(key)
+                )
+            nodes.append(node.mat())
+
+        size = storage.getNode('size')
+        size = (752, 480) if size.empty() else tuple(
+            int(v) for v in size.mat().ravel()[:2]
+        )
+    finally:
+        storage.release()
+
+    return StereoCalibration(*nodes, size=size, cache=cache)
+
+class StereoCalibration:
+    """Describes the intrinsics and extrinsics of a pair of cameras.
+
+    Centroids are mapped into the rectified pair, where both cameras share a
+    focal length and rows, so the disparity of a point is purely horizontal.
+    Positions found from rectified centroids are relative to the rectified
+    left camera, which is rotated slightly from the physical one.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        left_matrix,
+        left_distortion,
+        right_matrix,
+        right_distortion,
+        rotation,
+        translation,
+        size=(752, 480),
+        cache=None
+    ):
+        """Initializes a stereo calibration.
+
+        Args:
+            left_matrix      numpy.ndarray: The 3x3 camera matrix of the left
+                                            camera in pixels.
+            left_distortion  numpy.ndarray: The distortion coefficients of the
+                                            left camera, in OpenCV order.
+            right_matrix     numpy.ndarray: The 3x3 camera matrix of the right
+                                            camera in pixels.
+            right_distortion numpy.ndarray: The distortion coefficients of the
+                                            right camera, in OpenCV order.
+            rotation         numpy.ndarray: The 3x3 rotation from the left
+                                            camera to the right camera.
+            translation      numpy.ndarray: The translation from the left
+                                            camera to the right camera in
+                                            millimeters.
+            size             (int, int):    The (width, height) of the images
+                                            in pixels, default is (752, 480).
+            cache            str:           The directory lookup tables are
+                                            cached in between runs. Default is
+                                            `None`, which keeps them in memory
+                                            only.
+        """
+
+        try:
+            self.__left_matrix = self.__array(left_matrix, (3, 3))
+            self.__left_distortion = self.__array(left_distortion, (-1,))
+            self.__right_matrix = self.__array(right_matrix, (3, 3))
+            self.__right_distortion = self.__array(right_distortion, (-1,))
+            self.__rotation = self.__array(rotation, (3, 3))
+            self.__translation = self.__array(translation, (3,))
+            self.__size = (int(size[0]), int(size[1]))
+        except (TypeError, ValueError):
+            raise ValueError('*** Error: Malformed calibration! ***')
+
+        self.__cache = cache
+        self.__tables = None
+        self.__maps = None
+
+        (
+            self.__left_rotation,
+            self.__right_rotation,
+            self.__left_projection,
+            self.__right_projection,
+            self.__reprojection
+        ) = cv2.stereoRectify(
+            self.__left_matrix,
+            self.__left_distortion,
+            self.__right_matrix,
+            self.__right_distortion,
+            self.__size,
+            self.__rotation,
+            self.__translation,
+            flags=cv2.CALIB_ZERO_DISPARITY,
+            alpha=0
+        )[:5]
+
+    def signature(self):
+        """Fetches a digest of every parameter that shapes the tables.
+
+        Returns:
+            str: A hex digest naming the cached tables.
+        """
+
+        digest = hashlib.sha1(repr((self.VERSION, self.__size)).encode())
+        for array in [
+            self.__left_matrix,
+            self.__left_distortion,
+            self.__right_matrix,
+            self.__right_distortion,
+            self.__rotation,
+            self.__translation
+        ]:
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def size(self):
+        """Accessor to the image size.
+
+        Returns:
+            (int, int): The (width, height) of the images in pixels.
+        """
+
+        return self.__size
+
+    def focal_length(self):
+        """Accessor to the focal length of the rectified pair.
+
+        Returns:
+            float: The focal length in pixels.
+        """
+
+        return float(self.__left_projection[0, 0])
+
+    def centers(self):
+        """Accessor to the principal points of the rectified pair.
+
+        Returns:
+            ((float, float), (float, float)): The left and right centers in
+                                              pixels.
+        """
+
+        return (
+            (
+                float(self.__left_projection[0, 2]),
+                float(self.__left_projection[1, 2])
+            ),
+            (
+                float(self.__right_projection[0, 2]),
+                float(self.__right_projection[1, 2])
+            )
+        )
+
+    def baseline(self):
+        """Accessor to the distance between the rectified cameras.
+
+        Returns:
+            float: The baseline in millimeters.
+        """
+
+        return abs(
+            float(self.__right_projection[0, 3]) /
+            float(self.__right_projection[0, 0])
+        )
+
+    def reprojection(self):
+        """Accessor to the disparity-to-depth matrix of the rectified pair.
+
+        Returns:
+            numpy.ndarray: The 4x4 matrix Q used by `cv2.reprojectImageTo3D`.
+        """
+
+        return self.__reprojection
+
+    def rectify(self, points, side='left'):
+        """Maps raw pixel coordinates into the rectified pair.
+
+        Args:
+            points numpy.ndarray: An Nx2 array of (x, y) pixel coordinates as
+                                  seen by one camera.
+            side   str:           Either 'left' or 'right'. Default is 'left'.
+
+        Returns:
+            numpy.ndarray: An Nx2 array of rectified (x, y) coordinates.
+        """
+
+        table = self.__table(side)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        height, width = table.shape[:2]
+
+        x = np.clip(points[:, 0], 0, width - 1)
+        y = np.clip(points[:, 1], 0, height - 1)
+        x0 = np.minimum(x.astype(np.intp), width - 2)
+        y0 = np.minimum(y.astype(np.intp), height - 2)
+        fx = (x - x0)[:, None]
+        fy = (y - y0)[:, None]
+
+        top = table[y0, x0] * (1 - fx) + table[y0, x0 + 1] * fx
+        bottom = table[y0 + 1, x0] * (1 - fx) + table[y0 + 1, x0 + 1] * fx
+        return top * (1 - fy) + bottom * fy
+
+    def rectify_point(self, lx, ly, rx, ry):
+        """Maps a single pair of raw centroids into the rectified pair.
+
+        Args:
+            lx float: The x coordinate of the centroid from the left camera.
+            ly float: The y coordinate of the centroid from the left camera.
+            rx float: The x coordinate of the centroid from the right camera.
+            ry float: The y coordinate of the centroid from the right camera.
+
+        Returns:
+            (float, float, float, float): The rectified coordinates in the
+                                          same order.
+        """
+
+        left, right = self.__table('left'), self.__table('right')
+        lx, ly = self.__sample(left, lx, ly)
+        rx, ry = self.__sample(right, rx, ry)
+        return lx, ly, rx, ry
+
+    def rectify_images(self, left, right):
+        """Undistorts and rectifies a pair of whole images.
+
+        Args:
+            left  numpy.ndarray: The image from the left camera.
+            right numpy.ndarray: The image from the right camera.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): The rectified left and right
+                                            images.
+        """
+
+        if self.__maps is None:
+            self.__maps = self.__load()[1]
+        (lx, ly), (rx, ry) = self.__maps
+        return (
+            cv2.remap(left, lx, ly, cv2.INTER_LINEAR),
+            cv2.remap(right, rx, ry, cv2.INTER_LINEAR)
+        )
+
+    def __table(self, side):
+        if self.__tables is None:
+            self.__tables = self.__load()[0]
+        if side == 'left':
+            return self.__tables[0]
+        if side == 'right':
+            return self.__tables[1]
+        raise ValueError('*** Error: Side must be left or right! ***')
+
+    def __sample(self, table, x, y):
+        height, width = table.shape[:2]
+        x = min(max(x, 0.0), width - 1.0)
+        y = min(max(y, 0.0), height - 1.0)
+        x0 = min(int(x), width - 2)
+        y0 = min(int(y), height - 2)
+        fx = x - x0
+        fy = y - y0
+
+        (a, b), (c, d) = table[y0, x0:x0 + 2], table[y0 + 1, x0:x0 + 2]
+        top = a * (1 - fx) + b * fx
+        bottom = c * (1 - fx) + d * fx
+        point = top * (1 - fy) + bottom * fy
+        return float(point[0]), float(point[1])
+
+    def __load(self):
+        path = None
+        if self.__cache is not None:
+            path = os.path.join(
+                self.__cache,
+                'rectify-{}.npz'.format(self.signature())
+            )
+            try:
+                with np.load(path) as archive:
+                    return (
+                        (archive['left'], archive['right']),
+                        (
+                            (archive['left_x'], archive['left_y']),
+                            (archive['right_x'], archive['right_y'])
+                        )
+                    )
+            except (IOError, OSError, KeyError, ValueError):
+                pass
+
+        tables = (
+            self.__solve(
+                self.__left_matrix,
+                self.__left_distortion,
+                self.__left_rotation,
+                self.__left_projection
+            ),
+            self.__solve(
+                self.__right_matrix,
+                self.__right_distortion,
+                self.__right_rotation,
+                self.__right_projection
+            )
+        )
+        maps = (
+            cv2.initUndistortRectifyMap(
+                self.__left_matrix,
+                self.__left_distortion,
+                self.__left_rotation,
+                self.__left_projection,
+                self.__size,
+                cv2.CV_16SC2
+            ),
+            cv2.initUndistortRectifyMap(
+                self.__right_matrix,
+                self.__right_distortion,
+                self.__right_rotation,
+                self.__right_projection,
+                self.__size,
+                cv2.CV_16SC2
+            )
+        )
+
+        if path is not None:
+            if not os.path.isdir(self.__cache):
+                os.makedirs(self.__cache)
+            # write beside the cache and swap it in so a crash can't corrupt it
+            staging = path + '.tmp'
+            with open(staging, 'wb') as f:
+                np.savez(
+                    f,
+                    left=tables[0],
+                    right=tables[1],
+                    left_x=maps[0][0],
+                    left_y=maps[0][1],
+                    right_x=maps[1][0],
+                    right_y=maps[1][1]
+                )
+            os.rename(staging, path)
+
+        return tables, maps
+
+    def __solve(self, matrix, distortion, rotation, projection):
+        width, height = self.__size
+        grid = np.mgrid[0:height, 0:width][::-1].astype(np.float32)
+        grid = grid.reshape(2, -1).T.reshape(-1, 1, 2)
+        points = cv2.undistortPoints(
+            grid,
+            matrix,
+            distortion,
+            R=rotation,
+            P=projection
+        )
+        return points.reshape(height, width, 2).astype(np.float32)
+
+    def __array(self, value, shape):
+        return np.ascontiguousarray(value, dtype=np.float64).reshape(shape)
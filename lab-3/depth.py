@@ -0,0 +1,369 @@
+"""Estimates dense depth maps from pairs of rectified left and right images.
+
+A command line utility that block matches every pair of images across a range
+of disparities, converts the disparities into depth with the binocular geometry
+and stores the maps of a whole sequence in a single `.npy` file. Core
+functionality may also be hooked into by an external module.
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import sys
+import getopt
+import threading
+from multiprocessing.pool import ThreadPool
+
+import cv2
+import numpy as np
+
+from binocular import Binocular
+
+class DepthMapper:
+    """Describes a block matcher that turns image pairs into depth maps.
+
+    Each frame is cut into horizontal strips that overlap by half a block, so
+    every strip sees the rows its matches need, and the strips are matched on
+    a pool of threads.
+    """
+
+    def __init__(
+        self,
+        binocular=None,
+        calibration=None,
+        min_disparity=0,
+        num_disparities=64,
+        block=15,
+        threads=4
+    ):
+        """Initializes a depth mapper.
+
+        Args:
+            binocular       Binocular:         The camera setup depth is
+                                               measured with. Default is
+                                               `None`, which uses the defaults
+                                               of `Binocular`, or `calibration`
+                                               if one is given.
+            calibration     StereoCalibration: Rectifies raw image pairs before
+                                               matching. Default is `None`,
+                                               which expects rectified pairs.
+            min_disparity   int:               The smallest disparity searched
+                                               in pixels, default is 0.
+            num_disparities int:               The number of disparities
+                                               searched, a multiple of 16.
+                                               Default is 64.
+            block           int:               The odd width of the matched
+                                               blocks in pixels, from 5 to 255.
+                                               Default is 15.
+            threads         int:               The number of matching threads,
+                                               default is 4.
+        """
+
+        if num_disparities <= 0 or num_disparities % 16:
+            raise ValueError('*** Error: The number of disparities must be a'
+                             ' positive multiple of 16! ***')
+        if not 5 <= block <= 255 or not block % 2:
+            raise ValueError('*** Error: The block size must be odd and from'
+                             ' 5 to 255! ***')
+        if threads < 1:
+            raise ValueError('*** Error: Expected at least one thread! ***')
+
+        if binocular is None:
+            binocular = Binocular(calibration=calibration)
+
+        self.__binocular = binocular
+        self.__calibration = calibration
+        self.__min_disparity = min_disparity
+        self.__num_disparities = num_disparities
+        self.__block = block
+        self.__threads = threads
+        self.__local = threading.local()
+        self.__pool = ThreadPool(threads) if threads > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def disparity(self, left, right, out=None):
+        """Finds the disparity of every pixel of the left image.
+
+        Args:
+            left  numpy.ndarray|str: The left image or a path to it.
+            right numpy.ndarray|str: The right image or a path to it.
+            out   numpy.ndarray:     A float32 array the size of the image to
+                                     write into. Default is `None`, which
+                                     allocates one.
+
+        Returns:
+            numpy.ndarray: The disparity of each pixel in pixels as float32,
+                           NaN where no match was found.
+        """
+
+        return self.__disparity(*self.__prepare(left, right), out=out)
+
+    def compute(self, left, right, out=None):
+        """Finds the depth of every pixel of the left image.
+
+        Args:
+            left  numpy.ndarray|str: The left image or a path to it.
+            right numpy.ndarray|str: The right image or a path to it.
+            out   numpy.ndarray:     A float32 array the size of the image to
+                                     write into. Default is `None`, which
+                                     allocates one.
+
+        Returns:
+            numpy.ndarray: The Z coordinate of each pixel in millimeters as
+                           float32, NaN where it is unknown.
+        """
+
+        disparity = self.disparity(left, right, out)
+        return self.__binocular.depth(disparity, out=disparity)
+
+    def sequence(self, pairs, sink=None):
+        """Finds the depth maps of a sequence of image pairs.
+
+        The maps are sized from the first pair, so every other pair must be
+        the same size, or a `ValueError` naming it is raised.
+
+        Args:
+            pairs [(numpy.ndarray|str, numpy.ndarray|str)]: The left and right
+                                                            images or paths to
+                                                            them.
+            sink  str:                                      The path of a
+                                                            `.npy` file the
+                                                            maps are written
+                                                            through as they are
+                                                            found. Default is
+                                                            `None`, which keeps
+                                                            them in memory.
+
+        Returns:
+            numpy.ndarray: An NxHxW float32 array of depth maps, memory mapped
+                           to `sink` if one was given.
+        """
+
+        pairs = list(pairs)
+        if not pairs:
+            return np.empty((0, 0, 0), np.float32)
+
+        left, right = self.__prepare(*pairs[0])
+        shape = (len(pairs),) + left.shape
+        if sink is None:
+            maps = np.empty(shape, np.float32)
+        else:
+            maps = np.lib.format.open_memmap(
+                sink,
+                mode='w+',
+                dtype=np.float32,
+                shape=shape
+            )
+
+        for i, pair in enumerate(pairs):
+            if i:
+                left, right = self.__prepare(*pair)
+            if left.shape != shape[1:]:
+                raise ValueError(
+                    '*** Error: Expected pair {} to be {}x{} like the first,'
+                    ' but it is {}x{}! ***'.format(
+                        self.__name(i, pair),
+                        shape[2],
+                        shape[1],
+                        left.shape[1],
+                        left.shape[0]
+                    )
+                )
+            disparity = self.__disparity(left, right, maps[i])
+            self.__binocular.depth(disparity, out=disparity)
+
+        if sink is not None:
+            maps.flush()
+        return maps
+
+    def close(self):
+        """Stops the matching threads."""
+
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+    def __disparity(self, left, right, out=None):
+        height, width = left.shape
+        raw = np.empty((height, width), np.int16)
+
+        jobs = [
+            (left, right, raw, y0, y1) for y0, y1 in self.__strips(height)
+        ]
+        if self.__pool is None:
+            for job in jobs:
+                self.__match(job)
+        else:
+            self.__pool.map(self.__match, jobs)
+
+        if out is None:
+            out = np.empty((height, width), np.float32)
+        np.multiply(raw, 1.0 / 16, out=out, casting='unsafe')
+        out[raw < self.__min_disparity * 16] = np.nan
+        return out
+
+    def __prepare(self, left, right):
+        left, right = self.__gray(left), self.__gray(right)
+        if left.shape != right.shape:
+            raise ValueError('*** Error: Expected images of the same'
+                             ' size! ***')
+        if self.__calibration is not None:
+            left, right = self.__calibration.rectify_images(left, right)
+        return left, right
+
+    def __name(self, i, pair):
+        # paths say which pair best, otherwise its place in the sequence
+        if isinstance(pair[0], str):
+            return '{} and {}'.format(*pair)
+        return str(i + 1)
+
+    def __gray(self, image):
+        if isinstance(image, str):
+            path, image = image, cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise ValueError(
+                    '*** Error: Could not read image {}! ***'.format(path)
+                )
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def __strips(self, height):
+        rows = -(-height // self.__threads)
+        return [
+            (y0, min(y0 + rows, height)) for y0 in range(0, height, rows)
+        ]
+
+    def __match(self, job):
+        left, right, raw, y0, y1 = job
+        # half a block for the matching window and a row for the prefilter
+        pad = self.__block // 2 + 1
+        a0 = max(0, y0 - pad)
+        a1 = min(raw.shape[0], y1 + pad)
+
+        result = self.__matcher().compute(left[a0:a1], right[a0:a1])
+        raw[y0:y1] = result[y0 - a0:y1 - a0]
+
+    def __matcher(self):
+        # matchers hold scratch buffers, so every thread gets its own
+        matcher = getattr(self.__local, 'matcher', None)
+        if matcher is None:
+            matcher = cv2.StereoBM_create(self.__num_disparities, self.__block)
+            matcher.setMinDisparity(self.__min_disparity)
+            self.__local.matcher = matcher
+        return matcher
+
+def usage():
+    """Fetches the usage of the depth mapper.
+
+    Returns:
+        str: The usage.
+    """
+
+    return ('Usage: python depth.py [options] LEFT [RIGHT]'
+            '\n'
+            '\n    LEFT and RIGHT are images or directories of images, paired'
+            '\n    as by stereo.py.'
+            '\n'
+            '\n    options: -p, --pair        name|index  Pair images by'
+            '\n                                           name or by sorted'
+            '\n                                           position. Default'
+            '\n                                           is name.'
+            '\n'
+            '\n             -m, --min         PIXELS      Smallest disparity'
+            '\n                                           searched. Default is'
+            '\n                                           0.'
+            '\n'
+            '\n             -n, --num         COUNT       Number of'
+            '\n                                           disparities'
+            '\n                                           searched, a'
+            '\n                                           multiple of 16.'
+            '\n                                           Default is 64.'
+            '\n'
+            '\n             -b, --block       PIXELS      Width of the matched'
+            '\n                                           blocks. Default is'
+            '\n                                           15.'
+            '\n'
+            '\n             -t, --threads     COUNT       Number of matching'
+            '\n                                           threads. Default is'
+            '\n                                           4.'
+            '\n'
+            '\n             -c, --calibration FILE        Rectify raw pairs'
+            '\n                                           with an OpenCV'
+            '\n                                           stereo calibration.'
+            '\n'
+            '\n             -o, --output      FILE        Write the depth maps'
+            '\n                                           to a .npy file.'
+            '\n'
+            '\n             -h, --help                    Show this help'
+            '\n                                           message and exit.')
+
+def main():
+    try:
+        opts, args = getopt.getopt(
+            sys.argv[1:],
+            'hp:m:n:b:t:c:o:',
+            [
+                'help',
+                'pair=',
+                'min=',
+                'num=',
+                'block=',
+                'threads=',
+                'calibration=',
+                'output='
+            ]
+        )
+        options = dict(opts)
+        by = options.get('-p', options.get('--pair', 'name'))
+        minimum = int(options.get('-m', options.get('--min', 0)))
+        count = int(options.get('-n', options.get('--num', 64)))
+        block = int(options.get('-b', options.get('--block', 15)))
+        threads = int(options.get('-t', options.get('--threads', 4)))
+        calibration = options.get('-c', options.get('--calibration'))
+        output = options.get('-o', options.get('--output'))
+    except (getopt.GetoptError, ValueError) as e:
+        print('\n*** Error: {} ***\n\n{}\n'.format(e, usage()))
+        return
+
+    if '-h' in options or '--help' in options or not 1 <= len(args) <= 2:
+        print('\n{}\n'.format(usage()))
+        return
+
+    from stereo import StereoBatch
+
+    right = [args[1]] if len(args) == 2 else None
+    pairs = StereoBatch().pair([args[0]], right, by)
+
+    try:
+        if calibration is not None:
+            import calibration as stereo_calibration
+            calibration = stereo_calibration.load(calibration)
+
+        with DepthMapper(
+            calibration=calibration,
+            min_disparity=minimum,
+            num_disparities=count,
+            block=block,
+            threads=threads
+        ) as mapper:
+            maps = mapper.sequence([(l, r) for _, l, r in pairs], output)
+    except ValueError as e:
+        print('\n{}\n'.format(e))
+        return
+
+    print('frame,valid,median')
+    for (frame, _, _), depth in zip(pairs, maps):
+        valid = np.isfinite(depth)
+        median = np.median(depth[valid]) if valid.any() else float('nan')
+        print('{},{:.3f},{:.1f}'.format(frame, valid.mean(), median))
+
+if __name__ == '__main__':
+    main()
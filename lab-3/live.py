@@ -0,0 +1,471 @@
+"""Triangulates a ping-pong ball live from a pair of cameras.
+
+A command line utility that grabs frames from a left and a right camera on
+threads of their own, finds the ball in both eyes at once, pairs the frames
+taken closest together in time and streams the position of the ball in 3D space
+as a table, along with how long each position took from capture to
+triangulation. Recorded images or videos can be replayed as fake cameras to try
+the loop offline.
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import sys
+import getopt
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from binocular import Binocular
+from trajectory import TrajectoryTracker
+from ball_extractor import BallExtractor, StageStats
+from ball_extractor.region import RegionTracker
+from ball_extractor.stats import clock
+from ball_extractor.source import (
+    ImageSource,
+    CaptureSource,
+    ReplaySource,
+    open_source
+)
+
+class StereoLive:
+    """Pairs the frames of two cameras by time and locates the ball in both.
+
+    Each eye is searched on its own thread with its own ball extractor, and
+    since OpenCV releases the interpreter lock the two searches overlap. The
+    cameras drop frames rather than queue them when detection falls behind,
+    so a position is never older than a few frames.
+    """
+
+    def __init__(
+        self,
+        binocular=None,
+        tolerance=0.01,
+        track=False,
+        scale=1,
+        refine=True,
+        backlog=2
+    ):
+        """Initializes a live stereo loop.
+
+        Args:
+            binocular Binocular:              The camera setup to
+                                              triangulate with. Default is
+                                              `None`, which uses the
+                                              defaults of `Binocular`.
+            tolerance float:                  The largest difference in
+                                              seconds between the timestamps
+                                              of a left and a right frame
+                                              that are paired. Default is
+                                              0.01.
+            track     bool|TrajectoryTracker: Follows the ball with a Kalman
+                                              filter and searches each eye
+                                              only around where the ball is
+                                              predicted to appear next. A
+                                              `TrajectoryTracker` may be
+                                              passed to configure the
+                                              filter. Default is `False`.
+            scale     int:                    The pyramid scale used for
+                                              detection, see
+                                              `BallExtractor.stream`.
+                                              Default is 1.
+            refine    bool:                   Whether centers are refined to
+                                              sub-pixel accuracy, default is
+                                              `True`.
+            backlog   int:                    The number of detected frames
+                                              of each eye waiting to be
+                                              paired, default is 2.
+        """
+
+        self.__binocular = binocular or Binocular()
+        self.__tolerance = tolerance
+        self.__trajectory = None
+        if isinstance(track, TrajectoryTracker):
+            self.__trajectory = track
+        elif track:
+            self.__trajectory = TrajectoryTracker()
+        self.__scale = scale
+        self.__refine = refine
+        self.__backlog = backlog
+        self.__stats = StageStats()
+
+    def stats(self):
+        """Accessor to the statistics of the last run.
+
+        Holds the time spent detecting in both eyes, the `latency` from
+        capture to triangulation and the `skew` between paired frames, and
+        counts the frames detected and `dropped` by both cameras, the
+        `pairs` made, the frames left `unpaired` and the pairs where the
+        ball was `missed` by either eye.
+
+        Returns:
+            StageStats: The statistics.
+        """
+
+        return self.__stats
+
+    def run(self, left, right):
+        """Locates the ball in every pair of frames as they are captured.
+
+        Both sources are closed once the run ends, whether because either of
+        them ran out of frames or because the caller stopped iterating.
+        Latency is measured against `stats.clock`, which is how capture
+        devices and replays time their frames.
+
+        Args:
+            left  FrameSource: The frames of the left camera.
+            right FrameSource: The frames of the right camera.
+
+        Yields:
+            (float, float, float, float, float, float, float, float, float):
+                The timestamp of the pair, the X, Y and Z coordinates and
+                disparity in millimeters, the X, Y and Z coordinates of the
+                filtered trajectory and the latency in seconds. Coordinates
+                are `None` if the ball was not found in both frames, and the
+                trajectory is `None` unless tracking.
+        """
+
+        self.__stats.reset()
+        if self.__trajectory is not None:
+            self.__trajectory.reset()
+        compact = self.__binocular.compact()
+        # only a followed trajectory narrows the search of either eye
+        trackers = (None, None)
+        if self.__trajectory is not None:
+            trackers = (RegionTracker(), RegionTracker())
+        hints = (queue.Queue(), queue.Queue())
+        results = (
+            queue.Queue(maxsize=self.__backlog),
+            queue.Queue(maxsize=self.__backlog)
+        )
+        stopped = threading.Event()
+        failures = []
+
+        threads = []
+        for source, tracker, hinted, detected in zip(
+            (left, right),
+            trackers,
+            hints,
+            results
+        ):
+            thread = threading.Thread(
+                target=self.__detect,
+                args=(source, tracker, hinted, detected, stopped, failures)
+            )
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        period = None
+        previous = None
+        try:
+            for frames in self.__pair(results):
+                (tl, lc), (tr, rc) = frames
+                timestamp = 0.5 * (tl + tr)
+                if previous is not None and timestamp > previous:
+                    period = timestamp - previous
+                previous = timestamp
+
+                position = None
+                if len(lc) and len(rc):
+                    position = compact.position(
+                        lc[0][0],
+                        lc[0][1],
+                        rc[0][0],
+                        rc[0][1]
+                    )
+                if position is None:
+                    self.__stats.count('missed')
+                    position = (None, None, None, None)
+
+                filtered = (None, None, None)
+                if self.__trajectory is not None:
+                    filtered = self.__follow(
+                        timestamp,
+                        position,
+                        period,
+                        hints
+                    )
+
+                latency = clock() - max(tl, tr)
+                self.__stats.record('latency', latency, 0.0)
+                self.__stats.record('skew', abs(tl - tr), 0.0)
+                self.__stats.count('pairs')
+                yield (timestamp,) + position + filtered + (latency,)
+            if failures:
+                raise failures[0]
+        finally:
+            stopped.set()
+            left.close()
+            right.close()
+            for thread in threads:
+                thread.join()
+
+    def __detect(self, source, tracker, hinted, detected, stopped, failures):
+        # every eye gets an extractor, and so a detector, of its own
+        frames = BallExtractor().capture(
+            source,
+            None,
+            track=tracker,
+            scale=self.__scale,
+            refine=self.__refine,
+            stats=self.__stats
+        )
+        try:
+            for _, timestamp, circles in frames:
+                if not self.__put(detected, (timestamp, circles), stopped):
+                    return
+                self.__steer(tracker, hinted)
+        except Exception as e:
+            failures.append(e)
+        finally:
+            frames.close()
+        self.__put(detected, None, stopped)
+
+    def __put(self, detected, item, stopped):
+        # give up once the pairing loop has gone away
+        while not stopped.is_set():
+            try:
+                detected.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __steer(self, tracker, hinted):
+        # the tracker is only touched by this thread, and only while the
+        # capture is suspended between frames, so the latest hint of the
+        # pairing loop is applied here rather than from there
+        hint = None
+        while True:
+            try:
+                hint = hinted.get_nowait()
+            except queue.Empty:
+                break
+        if hint is not None and tracker is not None:
+            tracker.hint(*hint)
+
+    def __pair(self, results):
+        # match the oldest frames of both eyes, skipping the earlier of the
+        # two until they were taken close enough together
+        heads = [None, None]
+        while True:
+            for eye in (0, 1):
+                if heads[eye] is None:
+                    heads[eye] = results[eye].get()
+                    if heads[eye] is None:
+                        return
+
+            skew = heads[0][0] - heads[1][0]
+            if abs(skew) <= self.__tolerance:
+                yield heads[0], heads[1]
+                heads = [None, None]
+            elif skew < 0:
+                heads[0] = None
+                self.__stats.count('unpaired')
+            else:
+                heads[1] = None
+                self.__stats.count('unpaired')
+
+    def __follow(self, timestamp, position, period, hints):
+        if position[0] is None:
+            self.__trajectory.update(timestamp, None)
+        else:
+            self.__trajectory.update(timestamp, position[:3])
+
+        # steer both searches to where the ball should be next frame
+        if period is not None:
+            predicted = self.__trajectory.predict(timestamp + period)
+            if predicted is not None and predicted[2] > 0:
+                (lx, ly), (rx, ry) = self.__binocular.project(*predicted)
+                hints[0].put((lx, ly))
+                hints[1].put((rx, ry))
+
+        return self.__trajectory.position() or (None, None, None)
+
+def usage():
+    """Fetches the usage of the live stereo loop.
+
+    Returns:
+        str: The usage.
+    """
+
+    return ('Usage: python live.py [options] LEFT [RIGHT]'
+            '\n'
+            '\n    LEFT and RIGHT are capture devices, as an index or'
+            '\n    /dev/videoN, video files, or images or directories of'
+            '\n    images. Anything but a device is replayed as a fake'
+            '\n    camera. If RIGHT is omitted, LEFT must hold both'
+            '\n    "left" and "right" images, paired as by stereo.py.'
+            '\n'
+            '\n    options: -p, --pair        name|index  Pair images by'
+            '\n                                           name or by sorted'
+            '\n                                           position. Default'
+            '\n                                           is name.'
+            '\n'
+            '\n             -f, --fps         FPS         Rate recordings'
+            '\n                                           are replayed at.'
+            '\n                                           Default is 30.'
+            '\n'
+            '\n             -l, --loop        COUNT       Times images are'
+            '\n                                           replayed. Default'
+            '\n                                           is 1.'
+            '\n'
+            '\n             -t, --tolerance   MS          Largest time'
+            '\n                                           between paired'
+            '\n                                           frames. Default'
+            '\n                                           is 10.'
+            '\n'
+            '\n             -k, --track                   Follow the ball'
+            '\n                                           with a Kalman'
+            '\n                                           filter and search'
+            '\n                                           only where it is'
+            '\n                                           headed.'
+            '\n'
+            '\n             -s, --scale       FACTOR      Pyramid scale used'
+            '\n                                           for detection.'
+            '\n                                           Default is 1.'
+            '\n'
+            '\n             -c, --calibration FILE        Rectify with an'
+            '\n                                           OpenCV stereo'
+            '\n                                           calibration.'
+            '\n'
+            '\n             -o, --output      FILE        Write the table to'
+            '\n                                           a file instead of'
+            '\n                                           stdout.'
+            '\n'
+            '\n             -h, --help                    Show this help'
+            '\n                                           message and exit.'
+            '\n'
+            '\n    Latency, drops and detection times are printed to'
+            '\n    stderr once the run ends or is interrupted.')
+
+def open_cameras(args, by='name', fps=30.0, loop=1):
+    """Opens the left and right cameras named on the command line.
+
+    Anything but a capture device is replayed as a fake camera, with both eyes
+    played in step.
+
+    Args:
+        args [str]: One or two capture devices, videos, images or directories
+                    of images, see `usage`.
+        by   str:   How images are paired when `args` holds a single
+                    directory, see `StereoBatch.pair`. Default is 'name'.
+        fps  float: The rate recordings are replayed at, default is 30.
+        loop int:   The number of times images are replayed, default is 1.
+
+    Returns:
+        (FrameSource, FrameSource): The left and right cameras.
+    """
+
+    if len(args) == 1:
+        from stereo import StereoBatch
+
+        pairs = StereoBatch().pair([args[0]], None, by)
+        if not pairs:
+            raise ValueError('*** Error: Found no pairs of left and right'
+                             ' images! ***')
+        cameras = (
+            ImageSource([l for _, l, _ in pairs]),
+            ImageSource([r for _, _, r in pairs])
+        )
+    else:
+        cameras = (open_source(args[0]), open_source(args[1]))
+
+    start = clock() + 0.1
+    sources = []
+    for camera in cameras:
+        if isinstance(camera, CaptureSource) and camera.live():
+            sources.append(camera)
+        elif isinstance(camera, ImageSource):
+            sources.append(ReplaySource(camera, fps, loop, start=start))
+        else:
+            sources.append(ReplaySource(camera, fps, start=start))
+    return sources
+
+def format_row(row):
+    """Lays out a row yielded by `StereoLive.run` as CSV.
+
+    Args:
+        row tuple: The row.
+
+    Returns:
+        str: The line, with the latency in milliseconds.
+    """
+
+    cells = ['{:.6f}'.format(row[0])]
+    for value in row[1:-1]:
+        cells.append('' if value is None else '{:.3f}'.format(value))
+    cells.append('{:.3f}'.format(row[-1] * 1000.0))
+    return ','.join(cells) + '\n'
+
+def main():
+    try:
+        opts, args = getopt.getopt(
+            sys.argv[1:],
+            'hkp:f:l:t:s:c:o:',
+            [
+                'help',
+                'track',
+                'pair=',
+                'fps=',
+                'loop=',
+                'tolerance=',
+                'scale=',
+                'calibration=',
+                'output='
+            ]
+        )
+        options = dict(opts)
+        by = options.get('-p', options.get('--pair', 'name'))
+        fps = float(options.get('-f', options.get('--fps', 30)))
+        loop = int(options.get('-l', options.get('--loop', 1)))
+        tolerance = float(options.get('-t', options.get('--tolerance', 10)))
+        scale = int(options.get('-s', options.get('--scale', 1)))
+        calibration = options.get('-c', options.get('--calibration'))
+        output = options.get('-o', options.get('--output'))
+        track = '-k' in options or '--track' in options
+        if fps <= 0 or loop < 1 or tolerance < 0:
+            raise ValueError('The frame rate, loop count and tolerance must'
+                             ' be positive')
+    except (getopt.GetoptError, ValueError) as e:
+        print('\n*** Error: {} ***\n\n{}\n'.format(e, usage()))
+        return
+
+    if '-h' in options or '--help' in options or not 1 <= len(args) <= 2:
+        print('\n{}\n'.format(usage()))
+        return
+
+    try:
+        binocular = None
+        if calibration is not None:
+            import calibration as stereo_calibration
+            binocular = Binocular(
+                calibration=stereo_calibration.load(calibration)
+            )
+        left, right = open_cameras(args, by, fps, loop)
+    except ValueError as e:
+        print('\n{}\n'.format(e))
+        return
+
+    live = StereoLive(binocular, tolerance / 1000.0, track, scale)
+    out = open(output, 'w') if output else sys.stdout
+    try:
+        out.write('timestamp,x,y,z,disparity,tx,ty,tz,latency_ms\n')
+        for row in live.run(left, right):
+            out.write(format_row(row))
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output:
+            out.close()
+        sys.stderr.write(live.stats().format() + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Triangulates a ping-pong ball across pairs of left and right images.
+
+A command line utility that pairs left and right camera images by name or by
+index, finds the ball in both with a ball extractor and streams the position of
+the ball in 3D space for every pair as a table.
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import os
+import re
+import sys
+import getopt
+
+from binocular import Binocular
+from trajectory import TrajectoryTracker
+from ball_extractor import BallExtractor
+from ball_extractor.path import PathAccumulator
+
+class StereoBatch:
+    """Pairs left and right images and locates the ball seen in both."""
+
+    def __init__(self, binocular=None):
+        """Initializes a stereo batch.
+
+        Args:
+            binocular Binocular: The camera setup to triangulate with. Default
+                                 is `None`, which uses the defaults of
+                                 `Binocular`.
+        """
+
+        self.__binocular = binocular or Binocular()
+        self.__extractor = BallExtractor()
+
+    def pair(self, left, right=None, by='name'):
+        """Pairs up left and right images.
+
+        Args:
+            left  [str]: Paths to left images or directories of them. If
+                         `right` is omitted, images with "left" in their name
+                         are paired with those with "right" in their name.
+            right [str]: Paths to right images or directories of them. Default
+                         is `None`.
+            by    str:   Either 'name', which pairs images whose names match
+                         once "left" and "right" are removed, or 'index',
+                         which pairs the nth left and right images in sorted
+                         order and warns on stderr if there are more of one
+                         than the other. Default is 'name'.
+
+        Returns:
+            [(str, str, str)]: A list of (frame, left path, right path) tuples.
+        """
+
+        lefts, rights = self.__gather(left, right)
+
+        if by == 'index':
+            # the images past the shorter side have nothing to pair with,
+            # and the sides are likely out of step, so say so on stderr
+            # where it cannot end up among the rows
+            if len(lefts) != len(rights):
+                sys.stderr.write(
+                    '*** WARN: Found {} left but {} right images! Pairing'
+                    ' the first {}... ***\n'.format(
+                        len(lefts),
+                        len(rights),
+                        min(len(lefts), len(rights))
+                    )
+                )
+            pairs = []
+            for i, (l, r) in enumerate(zip(lefts, rights)):
+                pairs.append((str(i + 1), l, r))
+            return pairs
+
+        by_key = {}
+        for path in rights:
+            by_key[self.__key(path)] = path
+
+        pairs = []
+        for path in lefts:
+            key = self.__key(path)
+            if key in by_key:
+                pairs.append((key, path, by_key[key]))
+        return pairs
+
+    def triangulate(self, pairs, workers=2, scale=1, refine=True):
+        """Finds the ball in every pair and locates it in 3D space.
+
+        Both images of a pair are handed to the extractor back to back, so with
+        two or more workers they are searched in parallel.
+
+        Args:
+            pairs   [(str, str, str)]: The output of `pair`.
+            workers int:               The number of detection processes,
+                                       default is 2.
+            scale   int:               The pyramid scale used for detection,
+                                       see `BallExtractor.stream`. Default is
+                                       1.
+            refine  bool:              Whether centers are refined to
+                                       sub-pixel accuracy before they are
+                                       triangulated, since depth is most
+                                       sensitive to disparity. Default is
+                                       `True`.
+
+        Yields:
+            (str, float, float, float, float): The frame and the X, Y and Z
+                                               coordinates and disparity in
+                                               millimeters. The coordinates
+                                               are `None` if the ball was not
+                                               found in both images, or if
+                                               either could not be decoded.
+        """
+
+        normalize = PathAccumulator().normalize_prefix
+        paths = []
+        for _, left, right in pairs:
+            paths.append(normalize(left))
+            paths.append(normalize(right))
+
+        results = self.__extractor.stream(
+            paths,
+            None,
+            workers=workers,
+            scale=scale,
+            refine=refine,
+            sort=False
+        )
+
+        matched = self.__match(paths, results)
+        for frame, _, _ in pairs:
+            left_circles = next(matched)
+            right_circles = next(matched)
+            if left_circles is None or right_circles is None or (
+                not len(left_circles) or not len(right_circles)
+            ):
+                yield frame, None, None, None, None
+                continue
+
+            (x, y, z, d), err = self.__binocular.position(
+                tuple(left_circles[0][:2]),
+                tuple(right_circles[0][:2])
+            )
+            if err:
+                yield frame, None, None, None, None
+            else:
+                yield frame, x, y, z, d
+
+    def prompt(self):
+        """Runs a small command line interface."""
+
+        try:
+            opts, args = getopt.getopt(
+                sys.argv[1:],
+                'hp:w:s:t:o:',
+                ['help', 'pair=', 'workers=', 'scale=', 'track=', 'output=']
+            )
+            options = dict(opts)
+            by = options.get('-p', options.get('--pair', 'name'))
+            workers = int(options.get('-w', options.get('--workers', 2)))
+            scale = int(options.get('-s', options.get('--scale', 1)))
+            fps = options.get('-t', options.get('--track'))
+            fps = None if fps is None else float(fps)
+            if fps is not None and fps <= 0:
+                raise ValueError('The frame rate must be positive')
+            output = options.get('-o', options.get('--output'))
+        except (getopt.GetoptError, ValueError) as e:
+            print('\n*** Error: {} ***\n\n{}\n'.format(e, self.usage()))
+            return
+
+        if '-h' in options or '--help' in options or not 1 <= len(args) <= 2:
+            print('\n{}\n'.format(self.usage()))
+            return
+
+        right = [args[1]] if len(args) == 2 else None
+        pairs = self.pair([args[0]], right, by)
+
+        out = open(output, 'w') if output else sys.stdout
+        try:
+            rows = self.triangulate(pairs, workers, scale)
+            if fps is None:
+                out.write('frame,x,y,z,disparity\n')
+            else:
+                out.write('frame,x,y,z,disparity,tx,ty,tz\n')
+                rows = self.__track(rows, fps)
+            for row in rows:
+                out.write(self.__format_row(row))
+                out.flush()
+        finally:
+            if output:
+                out.close()
+
+    def usage(self):
+        """Fetches the usage of a stereo batch.
+
+        Returns:
+            str: The usage.
+        """
+
+        return ('Usage: python stereo.py [options] LEFT [RIGHT]'
+                '\n'
+                '\n    LEFT and RIGHT are images or directories of images.'
+                '\n    If RIGHT is omitted, LEFT must hold both "left" and'
+                '\n    "right" images.'
+                '\n'
+                '\n    options: -p, --pair    name|index    Pair images by'
+                '\n                                         name or by sorted'
+                '\n                                         position. Default'
+                '\n                                         is name.'
+                '\n'
+                '\n             -w, --workers COUNT         Number of'
+                '\n                                         detection'
+                '\n                                         processes. Default'
+                '\n                                         is 2.'
+                '\n'
+                '\n             -s, --scale   FACTOR        Pyramid scale used'
+                '\n                                         for detection.'
+                '\n                                         Default is 1.'
+                '\n'
+                '\n             -t, --track   FPS           Follow the ball'
+                '\n                                         with a Kalman'
+                '\n                                         filter, assuming'
+                '\n                                         pairs are frames'
+                '\n                                         this far apart,'
+                '\n                                         and add the'
+                '\n                                         smoothed'
+                '\n                                         trajectory.'
+                '\n'
+                '\n             -o, --output  FILE          Write the table to'
+                '\n                                         a file instead of'
+                '\n                                         stdout.'
+                '\n'
+                '\n             -h, --help                  Show this help'
+                '\n                                         message and exit.')
+
+    def __gather(self, left, right):
+        paths = PathAccumulator(['.jpg', '.jpeg'])
+        if right is not None:
+            return paths.path_walk(left), paths.path_walk(right)
+
+        lefts, rights = [], []
+        for path in paths.path_walk(left):
+            name = os.path.basename(path).lower()
+            if 'left' in name:
+                lefts.append(path)
+            elif 'right' in name:
+                rights.append(path)
+        return lefts, rights
+
+    def __match(self, paths, results):
+        # results arrive in path order, but images that can't be decoded are
+        # skipped and a path listed twice is only searched once, so pair each
+        # path with its circles, or `None`, without waiting on missing ones
+        uses = {}
+        for path in paths:
+            uses[path] = uses.get(path, 0) + 1
+
+        kept = {}
+        ahead = None
+        for path in paths:
+            uses[path] -= 1
+            if path in kept:
+                yield kept[path] if uses[path] else kept.pop(path)
+                continue
+
+            # only read on when needed, so each pair is yielded at once
+            if ahead is None:
+                ahead = next(results, None)
+            circles = None
+            if ahead is not None and ahead[0] == path:
+                circles = ahead[1]
+                ahead = None
+                if uses[path]:
+                    kept[path] = circles
+            yield circles
+
+    def __key(self, path):
+        name, _ = os.path.splitext(os.path.basename(path))
+        name = re.sub('(?i)left|right', '', name)
+        return name.strip('-_. ') or name
+
+    def __track(self, rows, fps):
+        tracker = TrajectoryTracker()
+        for i, row in enumerate(rows):
+            frame, x, y, z, _ = row
+            position = None if x is None else (x, y, z)
+            tracker.update(i / fps, position)
+            yield row + (tracker.position() or (None, None, None))
+
+    def __format_row(self, row):
+        cells = [row[0]]
+        for value in row[1:]:
+            cells.append('' if value is None else '{:.3f}'.format(value))
+        return ','.join(cells) + '\n'
+
+def main():
+    stereo_batch = StereoBatch()
+    stereo_batch.prompt()
+
+if __name__ == '__main__':
+    main()
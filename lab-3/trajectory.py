@@ -0,0 +1,262 @@
+"""Follows a ball through 3D space with a Kalman filter.
+
+Consumes the positions triangulated for each frame, rejects those that stray
+too far from where the ball should be, and smooths the rest into a trajectory.
+The prediction for the next frame can be projected back into the cameras to
+narrow where the ball extractor searches.
+"""
+
+__version__ = '1.0.0'
+__author__ = 'Mike Nystoriak'
+__credits__ = ['Mike Nystoriak']
+
+import numpy as np
+
+class TrajectoryTracker:
+    """Describes a Kalman filter over the position and velocity of a ball.
+
+    Each axis is filtered independently with a constant-velocity model driven
+    by white-noise acceleration, plus an optional constant acceleration for
+    ballistic flight, so every frame costs the same handful of operations
+    however long the ball is followed.
+    """
+
+    # 99% of a chi-squared distribution with 3 degrees of freedom
+    GATE = 11.34
+
+    def __init__(
+        self,
+        process_noise=5e6,
+        measurement_noise=25.0,
+        initial_speed=3000.0,
+        gravity=None,
+        gate=GATE,
+        max_misses=5
+    ):
+        """Initializes a trajectory tracker.
+
+        Args:
+            process_noise     float:                 The spectral density of
+                                                     the unmodelled
+                                                     acceleration in
+                                                     millimeters squared per
+                                                     second cubed, default is
+                                                     5e6.
+            measurement_noise float:                 The variance of a
+                                                     triangulated position in
+                                                     millimeters squared,
+                                                     default is 25.
+            initial_speed     float:                 The standard deviation of
+                                                     the speed of a ball that
+                                                     was just found in
+                                                     millimeters per second,
+                                                     default is 3000.
+            gravity           (float, float, float): The constant acceleration
+                                                     of the ball in camera
+                                                     coordinates in
+                                                     millimeters per second
+                                                     squared, e.g.
+                                                     (0, 9810, 0) for a level
+                                                     camera. Default is `None`,
+                                                     which assumes constant
+                                                     velocity.
+            gate              float:                 The largest squared
+                                                     Mahalanobis distance a
+                                                     position may be from the
+                                                     prediction, default is
+                                                     `GATE`.
+            max_misses        int:                   The number of frames in a
+                                                     row without an accepted
+                                                     position after which the
+                                                     ball is considered lost,
+                                                     default is 5.
+        """
+
+        self.__q = float(process_noise)
+        self.__r = float(measurement_noise)
+        self.__initial = float(initial_speed) ** 2
+        self.__gravity = np.zeros(3)
+        if gravity is not None:
+            self.__gravity = np.asarray(gravity, dtype=np.float64).reshape(3)
+        self.__gate = gate
+        self.__max_misses = max_misses
+        self.reset()
+
+    def reset(self):
+        """Forgets the ball so the next position starts a new trajectory."""
+
+        self.__time = None
+        self.__position = None
+        self.__velocity = None
+        # the 2x2 covariance of every axis, which is symmetric
+        self.__p00 = None
+        self.__p01 = None
+        self.__p11 = None
+        self.__misses = 0
+
+    def tracking(self):
+        """Accessor to whether a ball is being followed.
+
+        Returns:
+            bool: `True` if a trajectory has been started and not lost.
+        """
+
+        return self.__position is not None
+
+    def position(self):
+        """Accessor to the filtered position of the ball.
+
+        Returns:
+            (float, float, float): The X, Y and Z coordinates in millimeters,
+                                   or `None` if no ball is being followed.
+        """
+
+        if self.__position is None:
+            return None
+        return tuple(float(v) for v in self.__position)
+
+    def velocity(self):
+        """Accessor to the filtered velocity of the ball.
+
+        Returns:
+            (float, float, float): The velocity along X, Y and Z in
+                                   millimeters per second, or `None` if no ball
+                                   is being followed.
+        """
+
+        if self.__velocity is None:
+            return None
+        return tuple(float(v) for v in self.__velocity)
+
+    def predict(self, timestamp):
+        """Finds where the ball should be at a given time.
+
+        The filter itself is left untouched.
+
+        Args:
+            timestamp float: The time in seconds.
+
+        Returns:
+            (float, float, float): The predicted X, Y and Z coordinates in
+                                   millimeters, or `None` if no ball is being
+                                   followed.
+        """
+
+        if self.__position is None:
+            return None
+        dt = max(0.0, timestamp - self.__time)
+        position = (
+            self.__position +
+            self.__velocity * dt +
+            0.5 * self.__gravity * dt * dt
+        )
+        return tuple(float(v) for v in position)
+
+    def update(self, timestamp, position):
+        """Advances the filter to a new frame.
+
+        Args:
+            timestamp float:                 The time of the frame in seconds.
+            position  (float, float, float): The X, Y and Z coordinates
+                                             triangulated in the frame, or
+                                             `None` if the ball was not found.
+
+        Returns:
+            bool: `True` if `position` was accepted into the trajectory,
+                  `False` if it was missing or rejected by the gate.
+        """
+
+        if position is not None:
+            position = np.asarray(position, dtype=np.float64).reshape(3)
+            if not np.isfinite(position).all():
+                position = None
+
+        if self.__position is None:
+            if position is None:
+                return False
+            self.__start(timestamp, position)
+            return True
+
+        self.__advance(timestamp)
+        if position is None:
+            self.__miss()
+            return False
+
+        s = self.__p00 + self.__r
+        innovation = position - self.__position
+        if np.dot(innovation * innovation, 1.0 / s) > self.__gate:
+            # too many rejections in a row means the ball has moved on
+            if self.__misses + 1 >= self.__max_misses:
+                self.__start(timestamp, position)
+                return True
+            self.__miss()
+            return False
+
+        k0 = self.__p00 / s
+        k1 = self.__p01 / s
+        self.__position = self.__position + k0 * innovation
+        self.__velocity = self.__velocity + k1 * innovation
+        self.__p11 = self.__p11 - k1 * self.__p01
+        self.__p01 = (1.0 - k0) * self.__p01
+        self.__p00 = (1.0 - k0) * self.__p00
+        self.__misses = 0
+        return True
+
+    def smooth(self, samples):
+        """Filters a stream of triangulated positions.
+
+        Args:
+            samples iterable: (timestamp, x, y, z) tuples, where the
+                              coordinates are `None` if the ball was not found.
+
+        Yields:
+            (float, float, float, float, bool): The timestamp, the filtered
+                                                X, Y and Z coordinates, which
+                                                are `None` while no ball is
+                                                followed, and whether the
+                                                sample was accepted.
+        """
+
+        for timestamp, x, y, z in samples:
+            position = None if x is None else (x, y, z)
+            accepted = self.update(timestamp, position)
+            current = self.position()
+            if current is None:
+                yield timestamp, None, None, None, accepted
+            else:
+                yield (timestamp,) + current + (accepted,)
+
+    def __start(self, timestamp, position):
+        self.__time = timestamp
+        self.__position = position
+        self.__velocity = np.zeros(3)
+        self.__p00 = np.full(3, self.__r)
+        self.__p01 = np.zeros(3)
+        self.__p11 = np.full(3, self.__initial)
+        self.__misses = 0
+
+    def __advance(self, timestamp):
+        dt = timestamp - self.__time
+        if dt <= 0.0:
+            return
+        self.__time = timestamp
+
+        self.__position = (
+            self.__position +
+            self.__velocity * dt +
+            0.5 * self.__gravity * dt * dt
+        )
+        self.__velocity = self.__velocity + self.__gravity * dt
+
+        q = self.__q
+        self.__p00 = (
+            self.__p00 + 2.0 * dt * self.__p01 + dt * dt * self.__p11 +
+            q * dt * dt * dt / 3.0
+        )
+        self.__p01 = self.__p01 + dt * self.__p11 + q * dt * dt / 2.0
+        self.__p11 = self.__p11 + q * dt
+
+    def __miss(self):
+        self.__misses += 1
+        if self.__misses >= self.__max_misses:
+            self.reset()
@@ -0,0 +1,182 @@
+"""Load tests the sniffer, running on its simulated LED.
+
+Starts the sniffer with the sim backend on spare ports and blinks the LED at
+HZ through the counter register, as the web app does. CLIENTS protocol clients
+then subscribe to the LED, alongside as many raw clients as the web app opens,
+while one more client times READ requests. After SECONDS, reports the readings
+that reached the clients and how long they took from the register being read.
+
+Usage: python3 load_test.py [CLIENTS] [SECONDS] [HZ]
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SNIFFER = os.path.join(HERE, '..', 'sniffer')
+sys.path.insert(0, SNIFFER)
+
+import protocol
+from backends import CLOCK_HZ, SIMULATED
+from registers import LED_REGISTERS
+
+HOST = '127.0.0.1'
+STARTUP = 10.0
+READING = 4
+
+IDS = {register.name: register.id for register in LED_REGISTERS}
+
+def spare_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+def hz_to_counter(hz):
+    # as the web app converts it
+    return 0xFFFFFFFF if hz == 0 else round(CLOCK_HZ / hz / 2)
+
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def connect(port):
+    deadline = time.monotonic() + STARTUP
+    while True:
+        try:
+            return await asyncio.open_connection(HOST, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+async def expect_values(reader):
+    kind, payload = await protocol.read_message(reader)
+    if kind == protocol.ERROR:
+        raise RuntimeError(payload.decode('utf-8'))
+    return protocol.decode_values(payload)
+
+async def subscriber(port, latencies, counts):
+    reader, writer = await connect(port)
+    try:
+        writer.write(protocol.encode_ids(protocol.SUBSCRIBE, [IDS['led']]))
+        while True:
+            timestamp, _ = await expect_values(reader)
+            latencies.append(time.time() - timestamp)
+            counts['protocol'] += 1
+    finally:
+        writer.close()
+
+async def raw_client(port, counts):
+    reader, writer = await connect(port)
+    try:
+        while True:
+            await reader.readexactly(READING)
+            counts['raw'] += 1
+    finally:
+        writer.close()
+
+async def prober(port, hz, round_trips):
+    reader, writer = await connect(port)
+    try:
+        writer.write(protocol.encode_entries(
+            protocol.WRITE,
+            [(IDS['counter'], hz_to_counter(hz))]
+        ))
+        request = protocol.encode_ids(
+            protocol.READ,
+            [IDS['led'], IDS['counter']]
+        )
+        while True:
+            start = time.perf_counter()
+            writer.write(request)
+            await expect_values(reader)
+            round_trips.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+async def load(clients, seconds, hz, port, protocol_port):
+    latencies = []
+    round_trips = []
+    counts = {'protocol': 0, 'raw': 0}
+    # the prober sets the blink up before anyone subscribes
+    tasks = [asyncio.ensure_future(prober(protocol_port, hz, round_trips))]
+    while not round_trips:
+        await asyncio.sleep(0.01)
+    tasks += [
+        asyncio.ensure_future(subscriber(protocol_port, latencies, counts))
+        for _ in range(clients)
+    ]
+    tasks += [
+        asyncio.ensure_future(raw_client(port, counts))
+        for _ in range(clients)
+    ]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        if task.done():
+            # a client that stopped early failed, so say why
+            task.result()
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies, round_trips, counts
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    hz = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    port = spare_port()
+    protocol_port = spare_port()
+    sniffer = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(SNIFFER, 'sniffer.py'),
+            '--backend', SIMULATED,
+            '--port', str(port),
+            '--protocol-port', str(protocol_port)
+        ],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        latencies, round_trips, counts = asyncio.run(
+            load(clients, seconds, hz, port, protocol_port)
+        )
+    finally:
+        sniffer.terminate()
+        sniffer.wait()
+
+    print('{} protocol and {} raw clients, LED at {:g} Hz for {:g} s'.format(
+        clients,
+        clients,
+        hz,
+        seconds
+    ))
+    for kind in ('protocol', 'raw'):
+        print('{:<9} {:>12,.0f} readings/s {:>9,.1f} per client'.format(
+            kind,
+            counts[kind] / seconds,
+            counts[kind] / seconds / clients if clients else 0
+        ))
+    print('{:<9} {:>12,.0f} reads/s'.format(
+        'READ',
+        len(round_trips) / seconds
+    ))
+    print('\n{:<22} {:>9} {:>9} {:>9}'.format('ms', 'p50', 'p99', 'max'))
+    for name, samples in [
+        ('publish latency', latencies),
+        ('READ round trip', round_trips)
+    ]:
+        print('{:<22} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            name,
+            percentile(samples, 0.5) * 1000,
+            percentile(samples, 0.99) * 1000,
+            max(samples, default=float('nan')) * 1000
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Compares the register accesses per second of each way to reach the window.
+
+Runs the seek based reads and writes the sniffer used to make against the
+position independent `struct` accesses of `RegisterMap`, over an anonymous
+mapping the size of the LED peripheral's window, then repeats the map's reads
+on several threads while another thread writes.
+
+Usage: python3 register_access.py [COUNT] [ROUNDS] [THREADS]
+"""
+
+import os
+import sys
+import mmap
+import time
+import struct
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'sniffer'))
+
+from registers import RegisterMap
+
+WINDOW = 1000
+READING = struct.Struct('<I')
+
+def run(call, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def contended(registers, count, threads):
+    # readers share the map with a writer that never stops
+    stopped = threading.Event()
+
+    def write():
+        value = 0
+        while not stopped.is_set():
+            registers.write('counter', value)
+            value = (value + 1) & 0xFFFFFFFF
+
+    def read():
+        read_many = registers.read_many
+        keys = ('counter',)
+        for _ in range(count):
+            read_many(keys)
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for _ in range(threads)]
+    start = time.perf_counter()
+    writer.start()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - start
+    stopped.set()
+    writer.join()
+    return elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    with mmap.mmap(-1, WINDOW) as memory_map:
+        READING.pack_into(memory_map, 0, 1)
+        READING.pack_into(memory_map, 4, 5000000)
+        registers = RegisterMap(memory_map)
+        view = memoryview(memory_map)
+
+        def seek_read():
+            for _ in range(count):
+                memory_map.seek(0)
+                memory_map.read(4)
+
+        def seek_write():
+            for _ in range(count):
+                memory_map.seek(4)
+                memory_map.write(struct.pack('l', 5000000))
+
+        def unpack_from():
+            unpack = READING.unpack_from
+            for _ in range(count):
+                unpack(view, 0)
+
+        def pack_into():
+            pack = READING.pack_into
+            for _ in range(count):
+                pack(view, 4, 5000000)
+
+        def map_read():
+            read = registers.read
+            for _ in range(count):
+                read('led')
+
+        def map_read_many():
+            read_many = registers.read_many
+            keys = ('led', 'counter')
+            for _ in range(count):
+                read_many(keys)
+
+        def map_write():
+            write = registers.write
+            for _ in range(count):
+                write('counter', 5000000)
+
+        try:
+            print('{:<22} {:>14} {:>9}'.format(
+                'path',
+                'accesses/s',
+                'speedup'
+            ))
+            baselines = {}
+            for name, call, accesses, baseline in [
+                ('seek+read', seek_read, 1, 'read'),
+                ('unpack_from', unpack_from, 1, 'read'),
+                ('RegisterMap.read', map_read, 1, 'read'),
+                ('RegisterMap.read_many', map_read_many, 2, 'read'),
+                ('seek+write', seek_write, 1, 'write'),
+                ('pack_into', pack_into, 1, 'write'),
+                ('RegisterMap.write', map_write, 1, 'write')
+            ]:
+                rate = count * accesses / run(call, rounds)
+                baselines.setdefault(baseline, rate)
+                print('{:<22} {:>14,.0f} {:>8.1f}x'.format(
+                    name,
+                    rate,
+                    rate / baselines[baseline]
+                ))
+
+            # the 'l' the sniffer packed with is 8 bytes on 64-bit Linux
+            READING.pack_into(memory_map, 8, 0xDEADBEEF)
+            memory_map.seek(4)
+            memory_map.write(struct.pack('l', 5000000))
+            spilled = READING.unpack_from(memory_map, 8)[0] != 0xDEADBEEF
+            registers.write('counter', 5000000)
+            print('\nseek+write clobbers the next register: {}'.format(
+                spilled
+            ))
+
+            elapsed = contended(registers, count, threads)
+            print('{} readers beside a writer: {:,.0f} reads/s'.format(
+                threads,
+                count * threads / elapsed
+            ))
+        finally:
+            view.release()
+            registers.close()
+
+if __name__ == '__main__':
+    main()
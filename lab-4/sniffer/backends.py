@@ -0,0 +1,148 @@
+"""Windows of memory the sniffer can find its registers in.
+
+On the board the registers are the LED peripheral's, mapped from /dev/mem.
+Elsewhere a file or an anonymous mapping stands in for them, and may be driven
+by a simulation of the peripheral, so the sniffer runs on any Linux machine.
+"""
+
+import os
+import mmap
+import struct
+import threading
+import contextlib
+import time
+
+from registers import CODES, LED_REGISTERS
+
+BASE_ADDRESS = 0x43C00000
+WINDOW = 1000
+
+DEVMEM = 'devmem'
+FILE = 'file'
+ANONYMOUS = 'anon'
+SIMULATED = 'sim'
+BACKENDS = (DEVMEM, FILE, ANONYMOUS, SIMULATED)
+
+# the fabric clock the counter register counts the cycles of
+CLOCK_HZ = 50000000
+# counters that hold the LED off instead of blinking it
+OFF = (0, 0xFFFFFFFF)
+# the longest the simulation sleeps, so a new counter soon takes effect
+MAX_TICK = 0.01
+
+@contextlib.contextmanager
+def devmem(base_address=BASE_ADDRESS, size=WINDOW):
+    with open('/dev/mem', 'r+b') as f:
+        with mmap.mmap(f.fileno(), size, offset=base_address) as window:
+            yield window
+
+@contextlib.contextmanager
+def file_window(path, size=WINDOW):
+    # the file is created, or grown, to hold the whole window
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        with mmap.mmap(fd, size) as window:
+            yield window
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def anonymous(size=WINDOW):
+    with mmap.mmap(-1, size) as window:
+        yield window
+
+@contextlib.contextmanager
+def simulated(path=None, size=WINDOW):
+    # over a file, other processes can watch the simulation too
+    opened = anonymous(size) if path is None else file_window(path, size)
+    with opened as window:
+        with SimulatedLed(window):
+            yield window
+
+def open_window(backend, path=None):
+    if backend == DEVMEM:
+        return devmem()
+    if backend == FILE:
+        if path is None:
+            raise ValueError('The {} backend needs a path'.format(FILE))
+        return file_window(path)
+    if backend == ANONYMOUS:
+        return anonymous()
+    if backend == SIMULATED:
+        return simulated(path)
+    raise ValueError('No backend {!r}'.format(backend))
+
+class SimulatedLed:
+    """Blinks the LED register of a window the way the peripheral does.
+
+    The counter register holds the half period of the blink in cycles of the
+    fabric clock, so the LED toggles at CLOCK_HZ / counter / 2 Hz, or stays
+    off while the counter is one of OFF. The counter is read again at least
+    every MAX_TICK seconds, from a thread of its own, so writes to it take
+    effect much as they would on the board. Blinks too fast to sleep between
+    are sampled, so the LED shows the state it would have at each wake.
+    """
+
+    def __init__(self, window, registers=LED_REGISTERS):
+        by_name = {register.name: register for register in registers}
+        self.__window = window
+        self.__led = self.__access(by_name['led'])
+        self.__counter = self.__access(by_name['counter'])
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stopped.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def __access(self, register):
+        layout = struct.Struct('<' + CODES[register.width])
+        return (
+            lambda: layout.unpack_from(self.__window, register.offset)[0],
+            lambda value: layout.pack_into(
+                self.__window,
+                register.offset,
+                value
+            )
+        )
+
+    def __run(self):
+        read_led, write_led = self.__led
+        read_counter, _ = self.__counter
+        cycles = 0.0  # into the current half period
+        last = time.monotonic()
+        while True:
+            counter = read_counter()
+            now = time.monotonic()
+            if counter in OFF:
+                cycles = 0.0
+                write_led(0)
+                tick = MAX_TICK
+            else:
+                cycles += (now - last) * CLOCK_HZ
+                toggles, cycles = divmod(cycles, counter)
+                if toggles % 2:
+                    write_led(read_led() ^ 1)
+                tick = min((counter - cycles) / CLOCK_HZ, MAX_TICK)
+            last = now
+            if self.__stopped.wait(tick):
+                return
@@ -0,0 +1,91 @@
+"""Length prefixed binary messages for reading and writing registers.
+
+Every message is a header of the payload length (uint16) and the message type
+(uint8), followed by the payload, all little endian:
+
+    SUBSCRIBE  client -> server  uint16 register ids to be sent whenever they
+                                 change, replacing any earlier subscription
+    READ       client -> server  uint16 register ids to be sent once, now
+    WRITE      client -> server  (uint16 id, uint64 value) pairs, written at
+                                 once
+    VALUES     server -> client  float64 UNIX time the registers were read,
+                                 then (uint16 id, uint64 value) pairs
+    ERROR      server -> client  a UTF-8 message
+"""
+
+import struct
+import asyncio
+
+SUBSCRIBE = 0x01
+READ = 0x02
+WRITE = 0x03
+VALUES = 0x81
+ERROR = 0xFF
+
+HEADER = struct.Struct('<HB')
+REGISTER_ID = struct.Struct('<H')
+ENTRY = struct.Struct('<HQ')
+TIMESTAMP = struct.Struct('<d')
+
+MAX_PAYLOAD = 0xFFFF
+
+def encode(kind, payload=b''):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(
+            'Payload of {} bytes is too long'.format(len(payload))
+        )
+    message = bytearray(HEADER.size + len(payload))
+    HEADER.pack_into(message, 0, len(payload), kind)
+    message[HEADER.size:] = payload
+    return bytes(message)
+
+def encode_ids(kind, ids):
+    payload = bytearray(REGISTER_ID.size * len(ids))
+    for i, register_id in enumerate(ids):
+        REGISTER_ID.pack_into(payload, i * REGISTER_ID.size, register_id)
+    return encode(kind, payload)
+
+def encode_entries(kind, entries, timestamp=None):
+    entries = list(entries)
+    prefix = 0 if timestamp is None else TIMESTAMP.size
+    size = prefix + ENTRY.size * len(entries)
+    message = bytearray(HEADER.size + size)
+    HEADER.pack_into(message, 0, size, kind)
+    if timestamp is not None:
+        TIMESTAMP.pack_into(message, HEADER.size, timestamp)
+    offset = HEADER.size + prefix
+    for register_id, value in entries:
+        ENTRY.pack_into(message, offset, register_id, value)
+        offset += ENTRY.size
+    return bytes(message)
+
+def encode_values(timestamp, entries):
+    return encode_entries(VALUES, entries, timestamp)
+
+def encode_error(message):
+    return encode(ERROR, message.encode('utf-8')[:MAX_PAYLOAD])
+
+def decode_ids(payload):
+    if len(payload) % REGISTER_ID.size:
+        raise ValueError(
+            'Register ids must be {} bytes each'.format(REGISTER_ID.size)
+        )
+    return [value for value, in REGISTER_ID.iter_unpack(payload)]
+
+def decode_entries(payload):
+    if len(payload) % ENTRY.size:
+        raise ValueError('Entries must be {} bytes each'.format(ENTRY.size))
+    return list(ENTRY.iter_unpack(payload))
+
+def decode_values(payload):
+    timestamp, = TIMESTAMP.unpack_from(payload)
+    return timestamp, decode_entries(payload[TIMESTAMP.size:])
+
+async def read_message(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+        length, kind = HEADER.unpack(header)
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return kind, payload
@@ -0,0 +1,201 @@
+"""Named registers laid over a memory mapped window of the FPGA."""
+
+import struct
+import threading
+from collections import namedtuple
+
+READ = 'r'
+WRITE = 'w'
+READ_WRITE = 'rw'
+
+# little endian, as the Zynq's ARM cores and AXI registers are
+CODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+MAX_BATCHES = 64
+
+Register = namedtuple('Register', ['id', 'name', 'offset', 'width', 'access'])
+
+# the virtual LED peripheral: the LED itself and the half period of its blink
+# in cycles of the 50 MHz fabric clock
+LED_REGISTERS = (
+    Register(0, 'led', 0, 4, READ),
+    Register(1, 'counter', 4, 4, READ_WRITE),
+)
+
+class RegisterMap:
+    """Reads and writes registers by id or name, many at a time.
+
+    Registers are accessed with `struct.unpack_from` and `pack_into` at fixed
+    offsets of a memoryview over the window, so there is no file position to
+    share and nothing is copied. A batch of registers is read with a single
+    layout that pads over the bytes between them. Reads take no lock and may
+    run on any number of threads; writers hold a lock so that the registers
+    of one batch are written together, though a reader may still see a batch
+    half written.
+    """
+
+    def __init__(self, buffer, registers=LED_REGISTERS):
+        self.__buffer = memoryview(buffer)
+        self.__registers = tuple(registers)
+        self.__by_key = {}
+        self.__structs = {}
+        # the calls and offsets every key resolves to, so single accesses
+        # skip the lookups and checks
+        self.__readers = {}
+        self.__writers = {}
+        for register in self.__registers:
+            if register.width not in CODES:
+                raise ValueError(
+                    'Register {} has an unsupported width of {}'.format(
+                        register.name,
+                        register.width
+                    )
+                )
+            if register.offset + register.width > self.__buffer.nbytes:
+                raise ValueError(
+                    'Register {} lies outside the window'.format(register.name)
+                )
+            if register.id in self.__by_key or register.name in self.__by_key:
+                raise ValueError(
+                    'Register {} is declared twice'.format(register.name)
+                )
+            self.__by_key[register.id] = register
+            self.__by_key[register.name] = register
+            layout = struct.Struct('<' + CODES[register.width])
+            self.__structs[register.id] = layout
+            for key in (register.id, register.name):
+                if READ in register.access:
+                    self.__readers[key] = (layout.unpack_from, register.offset)
+                if WRITE in register.access:
+                    self.__writers[key] = (
+                        layout.pack_into,
+                        register.offset,
+                        1 << 8 * register.width
+                    )
+        self.__batches = {}
+        self.__write_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        # the window can't be unmapped while a view of it is held
+        self.__buffer.release()
+
+    def registers(self):
+        return self.__registers
+
+    def register(self, key):
+        try:
+            return self.__by_key[key]
+        except KeyError:
+            raise ValueError('No register {!r}'.format(key))
+
+    def read(self, key):
+        try:
+            unpack_from, offset = self.__readers[key]
+        except KeyError:
+            self.__readable(key)
+            raise
+        return unpack_from(self.__buffer, offset)[0]
+
+    def write(self, key, value):
+        try:
+            pack_into, offset, limit = self.__writers[key]
+        except KeyError:
+            self.__writable(key, 0)
+            raise
+        if not 0 <= value < limit:
+            self.__writable(key, value)
+        with self.__write_lock:
+            pack_into(self.__buffer, offset, value)
+
+    def read_many(self, keys):
+        keys = tuple(keys)
+        # racing threads may both compile a batch, which is harmless
+        batch = self.__batches.get(keys)
+        if batch is None:
+            batch = self.__compile(keys)
+        layout, start, order = batch
+        if layout is None:
+            return tuple(self.read(key) for key in keys)
+        values = layout.unpack_from(self.__buffer, start)
+        if order is None:
+            return values
+        return tuple(values[i] for i in order)
+
+    def write_many(self, pairs):
+        # check every value before writing any, so a batch lands whole or not
+        # at all
+        pairs = [(self.__writable(key, value), value) for key, value in pairs]
+        with self.__write_lock:
+            for register, value in pairs:
+                self.__structs[register.id].pack_into(
+                    self.__buffer,
+                    register.offset,
+                    value
+                )
+
+    def __compile(self, keys):
+        registers = [self.__readable(key) for key in keys]
+
+        # lay the registers out by offset, padding over the gaps between them
+        ranked = sorted(
+            range(len(registers)),
+            key=lambda i: registers[i].offset
+        )
+        start = registers[ranked[0]].offset if registers else 0
+        layout = '<'
+        cursor = start
+        for i in ranked:
+            register = registers[i]
+            if register.offset < cursor:
+                # overlapping registers can't share one layout
+                layout = None
+                break
+            if register.offset > cursor:
+                layout += '{}x'.format(register.offset - cursor)
+            layout += CODES[register.width]
+            cursor = register.offset + register.width
+
+        order = [0] * len(registers)
+        for position, i in enumerate(ranked):
+            order[i] = position
+        if ranked == list(range(len(ranked))):
+            order = None
+        batch = (
+            None if layout is None else struct.Struct(layout),
+            start,
+            order
+        )
+        # clients choose what they read, so don't let the cache grow unbounded
+        if len(self.__batches) >= MAX_BATCHES:
+            self.__batches.clear()
+        self.__batches[keys] = batch
+        return batch
+
+    def __readable(self, key):
+        register = self.register(key)
+        if READ not in register.access:
+            raise ValueError(
+                'Register {} is not readable'.format(register.name)
+            )
+        return register
+
+    def __writable(self, key, value):
+        register = self.register(key)
+        if WRITE not in register.access:
+            raise ValueError(
+                'Register {} is not writable'.format(register.name)
+            )
+        if not 0 <= value < 1 << 8 * register.width:
+            raise ValueError(
+                'Value {} does not fit register {}'.format(
+                    value,
+                    register.name
+                )
+            )
+        return register
@@ -1,37 +1,208 @@
 import time
-import mmap
 import struct
-import socket
-import threading
+import asyncio
+import argparse
 
-def sniff(memory_map, offset=0):
-    memory_map.seek(offset)
-    return memory_map.read(4)
+import backends
+import protocol
+from registers import READ, RegisterMap
 
-def lick(memory_map, offset=0, value=0):
-    memory_map.seek(offset)
-    memory_map.write(struct.pack('l', value))
+def offer(queue, value):
+    # a client that falls behind loses its oldest readings, not our memory
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(value)
 
-def socket_sender(conn, memory_map):
+def legacy_reading(value):
+    return struct.pack('<I', value)
+
+async def register_poller(registers, clients, latest, changed, options):
+    # every readable register is read at once, subscribed to or not
+    readable = [r.id for r in registers.registers() if READ in r.access]
+    values = latest['values']
+    while True:
+        if clients:
+            now = time.time()
+            for register_id, value in zip(
+                readable,
+                registers.read_many(readable)
+            ):
+                if values.get(register_id) != value:
+                    values[register_id] = value
+                    latest['dirty'].add(register_id)
+            latest['time'] = now
+            if latest['dirty']:
+                changed.set()
+        await asyncio.sleep(options.poll_interval)
+
+async def register_publisher(clients, latest, changed, options):
+    led = latest['led']
+    while True:
+        # publish as soon as a value changes, or resend them all once a
+        # heartbeat has passed without a change
+        try:
+            await asyncio.wait_for(changed.wait(), options.heartbeat)
+            ids = latest['dirty']
+        except asyncio.TimeoutError:
+            ids = set(latest['values'])
+        changed.clear()
+        latest['dirty'] = set()
+
+        # clients subscribed to the same registers share one message
+        messages = {}
+        for queue, subscription in list(clients.items()):
+            if subscription is None:
+                if led in ids:
+                    offer(queue, legacy_reading(latest['values'][led]))
+                continue
+            wanted = tuple(sorted(ids & subscription))
+            if not wanted:
+                continue
+            if wanted not in messages:
+                messages[wanted] = protocol.encode_values(
+                    latest['time'],
+                    [(i, latest['values'][i]) for i in wanted]
+                )
+            offer(queue, messages[wanted])
+        # changes made meanwhile are merged into the next publish
+        await asyncio.sleep(1 / options.max_rate)
+
+async def socket_sender(writer, queue):
+    while True:
+        writer.write(await queue.get())
+        await writer.drain()
+
+async def socket_listener(reader, queue, registers):
+    while True:
+        data = await reader.read(12)
+        if not data:
+            return
+        try:
+            registers.write('counter', bytes2int(data))
+        except ValueError as e:
+            print('Ignoring counter: {}'.format(e))
+
+async def protocol_listener(reader, queue, registers, clients):
+    while True:
+        message = await protocol.read_message(reader)
+        if message is None:
+            return
+        kind, payload = message
+        try:
+            if kind == protocol.SUBSCRIBE or kind == protocol.READ:
+                ids = protocol.decode_ids(payload)
+                values = registers.read_many(ids)
+                if kind == protocol.SUBSCRIBE:
+                    clients[queue] = frozenset(ids)
+                offer(queue, protocol.encode_values(
+                    time.time(),
+                    zip(ids, values)
+                ))
+            elif kind == protocol.WRITE:
+                registers.write_many(protocol.decode_entries(payload))
+            else:
+                raise ValueError('Unknown message type {}'.format(kind))
+        except ValueError as e:
+            offer(queue, protocol.encode_error(str(e)))
+
+async def handle_client(
+    reader,
+    writer,
+    listener,
+    clients,
+    subscription,
+    greeting=None
+):
+    queue = asyncio.Queue(maxsize=CLIENT_BACKLOG)
+    if greeting is not None:
+        offer(queue, greeting)  # new clients needn't wait for a change
+    clients[queue] = subscription
+    tasks = [
+        asyncio.ensure_future(socket_sender(writer, queue)),
+        asyncio.ensure_future(listener(reader, queue))
+    ]
     try:
-        with conn:
-            while True:
-                conn.sendall(sniff(memory_map))
-                time.sleep(0.01)  # don't DDoS the browser
-    except (ConnectionResetError, BrokenPipeError):
-        print('Connection dropped. Aborting sender...')
-        return
-
-def socket_listener(conn, memory_map):
+        # whichever half ends first takes the other down with it
+        done, _ = await asyncio.wait(
+            tasks,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if any(task.exception() is not None for task in done):
+            print('Connection dropped. Aborting client...')
+    finally:
+        clients.pop(queue, None)
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+async def serve(memory_map, options):
+    registers = RegisterMap(memory_map)
+    # clients map their queue to the registers they follow, or to `None` for
+    # the raw LED readings of the original protocol
+    clients = {}
+    latest = {
+        'values': {},
+        'dirty': set(),
+        'time': None,
+        'led': registers.register('led').id
+    }
+    changed = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(
+            register_poller(registers, clients, latest, changed, options)
+        ),
+        asyncio.ensure_future(
+            register_publisher(clients, latest, changed, options)
+        )
+    ]
+
+    def legacy_client(reader, writer):
+        led = latest['values'].get(latest['led'])
+        listener = lambda reader, queue: socket_listener(
+            reader,
+            queue,
+            registers
+        )
+        return handle_client(
+            reader,
+            writer,
+            listener,
+            clients,
+            None,
+            None if led is None else legacy_reading(led)
+        )
+
+    def protocol_client(reader, writer):
+        listener = lambda reader, queue: protocol_listener(
+            reader,
+            queue,
+            registers,
+            clients
+        )
+        return handle_client(reader, writer, listener, clients, frozenset())
+
+    servers = [
+        await asyncio.start_server(
+            legacy_client,
+            options.host,
+            options.port,
+            reuse_address=True
+        ),
+        await asyncio.start_server(
+            protocol_client,
+            options.host,
+            options.protocol_port,
+            reuse_address=True
+        )
+    ]
     try:
-        with conn:
-            while True:
-                data = conn.recv(12)
-                if data:
-                    lick(memory_map, 4, bytes2int(data))
-    except (ConnectionResetError, BrokenPipeError):
-        print('Connection dropped. Aborting listener...')
-        return
+        await asyncio.gather(*[server.serve_forever() for server in servers])
+    finally:
+        for task in tasks:
+            task.cancel()
+        for server in servers:
+            server.close()
+        registers.close()
 
 def bytes2int(b):
     curr = 0
@@ -42,20 +213,73 @@ def bytes2int(b):
 
 HOST = '127.0.0.1'
 PORT = 30001
-BASE_ADDRESS = 0x43C00000
-
-# open dev mem and see to base address
-with open('/dev/mem', 'r+b') as f:
-    with mmap.mmap(f.fileno(), 1000, offset=BASE_ADDRESS) as mem:
-        # open socket server
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.bind((HOST, PORT))
-            s.listen()
-
-            while True:
-                conn, _ = s.accept()
-                sender = threading.Thread(target=socket_sender, args=[conn, mem])
-                listener = threading.Thread(target=socket_listener, args=[conn, mem])
-                sender.start()
-                listener.start()
\ No newline at end of file
+PROTOCOL_PORT = 30002
+POLL_INTERVAL = 0.005
+MAX_RATE = 100
+HEARTBEAT = 1.0
+CLIENT_BACKLOG = 16
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Publishes a register of the virtual LED to its clients.'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=backends.BACKENDS,
+        default=backends.DEVMEM,
+        help='where the registers are: the board\'s /dev/mem, a file, an'
+             ' anonymous mapping or a simulated LED (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--file',
+        help='file to map for the file backend, or for the sim backend to'
+             ' drive instead of an anonymous mapping'
+    )
+    parser.add_argument(
+        '--host',
+        default=HOST,
+        help='address to serve on (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=PORT,
+        help='port of the raw LED readings (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--protocol-port',
+        type=int,
+        default=PROTOCOL_PORT,
+        help='port of the register protocol (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=POLL_INTERVAL,
+        help='seconds between reads of the register (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--max-rate',
+        type=float,
+        default=MAX_RATE,
+        help='most values published per second (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--heartbeat',
+        type=float,
+        default=HEARTBEAT,
+        help='seconds after which an unchanged value is published again'
+             ' (default: %(default)s)'
+    )
+    options = parser.parse_args()
+    if min(options.poll_interval, options.max_rate, options.heartbeat) <= 0:
+        parser.error('intervals and rates must be positive')
+    if options.backend == backends.FILE and options.file is None:
+        parser.error('the file backend needs --file')
+
+    with backends.open_window(options.backend, options.file) as window:
+        # one event loop serves every client from a single polling task
+        asyncio.run(serve(window, options))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 #!/bin/bash
 
-python3 sniffer/sniffer.py > /dev/null 2>&1 &
+python3 sniffer/sniffer.py "$@" > /dev/null 2>&1 &
 
 cd app
 npm start
\ No newline at end of file